@@ -1,14 +1,40 @@
 import pandas as pd
 import os
 import shutil
+import tempfile
 import re
 import chardet
 import json
 import datetime
+import time
 import ast
 import requests
+import argparse
 import re
 import numpy as np
+import openpyxl
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from types import MappingProxyType, SimpleNamespace
+from reference_store import (
+    REFERENCE_BACKENDS,
+    can_use_fingerprints,
+    export_path,
+    normalize_na,
+    open_reference_store,
+    row_fingerprints,
+)
+from instrumentation import RunReport
+from output_writer import OUTPUT_FORMATS, atomic_write, write_outputs
+from parse_cache import MAX_ENTRIES, ParseCache, parse_cache_path, parse_cache_stats
+from sync_client import (
+    FETCH_PAGE_SIZE,
+    FIELD_DETAILS_URL,
+    SYNC_BATCH_SIZE,
+    partial_update_records,
+    start_reference_download,
+    sync_records,
+)
 
 
 # print(df.columns)
@@ -45,128 +71,176 @@ column_names = {
 }
 
 
-def create_xid(row):
-    if row["rescom"] in ["RESIDENTIAL", "Residential", "residential"]:
-        return f"R{row['XID']}"
-    else:
-        return f"C{row['XID']}"
+def create_xids(df):
+    """Prefix XIDs with R (residential, any case) or C (everything else)."""
+    is_residential = df["rescom"].astype(str).str.lower().eq("residential")
+    prefix = pd.Series(np.where(is_residential, "R", "C"), index=df.index)
+    return prefix + df["XID"].astype(str)
 
 
-def generate_id(row):
-    date = row["Visit Date"]
-    if pd.isna(date):
-        date = row["Modify Date"].date()
-    if pd.isna(date):
-        return f"{row['XID']}_MISSING_DATE"  # Fallback if both are NaT
-    else:
-        return f"{row['XID']}_{pd.to_datetime(date).strftime('%Y%m%d')}"
+def generate_ids(xids, visit_date, modify_date):
+    """Build <XID>_<YYYYMMDD> from the visit date, falling back to the modify date."""
+    id_date = visit_date.dt.normalize().fillna(modify_date.dt.normalize())
+    ids = xids + "_" + id_date.dt.strftime("%Y%m%d")
+    return ids.where(id_date.notna(), xids + "_MISSING_DATE")
 
 
-def parse_basic_details(text):
-    details = {}
-    for line in str(text).splitlines():
-        if ":" in line:
-            key, val = line.split(":", 1)
-            key = key.strip()
-            val = val.strip()
-            # only include if key is present in mapping
-            if key in column_names and val not in ("", "null", "[]", None):
-                details[column_names[key]] = val
-    return details
+PHASE_NAME_PATTERN = re.compile(r"(.+?)_\d+_(?:UC_|RTM_)")
+RERA_NUMBER_PATTERN = re.compile(r"(?:RTM_|UC_)([A-Za-z0-9/_-]+)")
+PHASE_IDENTIFIER_CACHE_SIZE = 65536
 
 
 def parse_phase_identifier(phase_identifier):
+    """Split a phase identifier into its phase name and RERA number (read-only)."""
     if not isinstance(phase_identifier, str):
-        return {"phaseIdentifier": "", "RERA_Number": ""}
+        return MappingProxyType({"phaseIdentifier": "", "RERA_Number": ""})
+    return _parse_phase_identifier(phase_identifier)
+
 
+@lru_cache(maxsize=PHASE_IDENTIFIER_CACHE_SIZE)
+def _parse_phase_identifier(phase_identifier):
     # Extract phase name (everything before _<number>_UC_ or _<number>_RTM_)
-    phase_name_match = re.search(r"(.+?)_\d+_(?:UC_|RTM_)", phase_identifier)
+    phase_name_match = PHASE_NAME_PATTERN.search(phase_identifier)
     phase_name = phase_name_match.group(1).strip() if phase_name_match else ""
 
     # Extract project/RERA code (everything after UC_ or RTM_)
-    rera_match = re.search(r"(?:RTM_|UC_)([A-Za-z0-9/_-]+)", phase_identifier)
+    rera_match = RERA_NUMBER_PATTERN.search(phase_identifier)
     rera_number = rera_match.group(1) if rera_match else ""
     # rera_number = "" if rera_number.lower() == "null" else rera_number
 
     # Clean invalid/null values
     if not rera_number or rera_number.lower() == "null":
-        return {"Phase Identifier": phase_name}
+        return MappingProxyType({"Phase Identifier": phase_name})
 
-    return {"Phase Identifier": phase_name, "RERA Number": rera_number}
+    return MappingProxyType(
+        {"Phase Identifier": phase_name, "RERA Number": rera_number}
+    )
 
 
-def parse_phase_blocks(text):
-    # Split text into blocks starting with 'phaseIdentifier:'
-    blocks = re.split(r"(?=phaseIdentifier:)", text.strip())
-    result = []
+# Phase-cache lookups made inside process_data worker processes
+_worker_cache_stats = {"hits": 0, "misses": 0}
 
-    for block in blocks:
-        block = block.strip()
-        if not block:
-            continue
-
-        data = {}
-        for line in block.splitlines():
-            if ":" in line:
-                key, val = line.split(":", 1)
-                if val.strip() == "null" or val.strip() == "" or val.strip() == "[]":
-                    continue
-                data[column_names[key.strip()]] = val.strip()
 
-        # If phaseIdentifier exists, parse it
-        if "Phase Identifier" in data:
-            parsed = parse_phase_identifier(data["Phase Identifier"])
-            for key, val in parsed.items():
-                data[key] = val
+def phase_identifier_cache_info():
+    """Hits, misses and size of the parse_phase_identifier cache (incl. workers)."""
+    info = _parse_phase_identifier.cache_info()
+    return info._replace(
+        hits=info.hits + _worker_cache_stats["hits"],
+        misses=info.misses + _worker_cache_stats["misses"],
+    )
 
-        if data:  # only add if block has data
-            result.append(data)
 
-    return result
+# ----------------------------
+# Field-block tokenizer
+# ----------------------------
+PHASE_BLOCK_SPLIT = re.compile(r"(?=phaseIdentifier:)")
+OPTION_BLOCK_SPLIT = re.compile(r"(?=superArea:)")
 
+NULL_VALUES = frozenset(("", "null", "[]"))
+EMPTY_VALUES = frozenset(("",))
 
-def parse_brochure(text):
-    column_mapping = {
-        "original": "Brochure Link",
-        "Source": "Brochure Source",
-        "phaseIdentifier": "Phase Identifier",
-    }
+_BRACKET_QUOTES = str.maketrans("", "", "[]'")
 
-    blocks = re.split(r"(?=phaseIdentifier:)", text.strip())
-    result = []
 
-    # print(blocks)
+def strip_brackets(val):
+    return val.translate(_BRACKET_QUOTES)
 
-    for block in blocks:
-        block = block.strip()
-        if not block:
-            continue
 
-        details = {}  # move inside loop so it resets for each block
-        for line in block.splitlines():  # ✅ use block, not text
-            if ":" in line:
-                key, val = line.split(":", 1)
-                key = key.strip()
-                val = val.strip().replace("[", "").replace("]", "").replace("'", "")
+def strip_query(val):
+    return val.partition("?")[0]
 
-                if key in column_mapping and val not in ("", "null", "[]", None):
-                    details[column_mapping[key]] = val
 
-        # Optional: parse phaseIdentifier if present
-        if "Phase Identifier" in details:
-            parsed = parse_phase_identifier(details["Phase Identifier"])
+def tokenize_blocks(text, block_split=None):
+    """
+    Scan a multiline `key: value` cell once and yield (block, key, value) triples.
+    A new block starts at every match of `block_split` (e.g. 'phaseIdentifier:').
+    """
+    blocks = block_split.split(text.strip()) if block_split else [text]
+    for block_no, block in enumerate(blocks):
+        for line in block.splitlines():
+            key, sep, val = line.partition(":")
+            if sep:
+                yield block_no, key.strip(), val.strip()
+
+
+def _finish_block(details, spec, result):
+    """Resolve the phase identifier of a parsed block and add it to `result`."""
+    phase = spec.get("phase")
+    if "Phase Identifier" in details:
+        parsed = parse_phase_identifier(details["Phase Identifier"])
+        if phase == "merge":
+            details.update(parsed)
+        elif phase == "name":
             details["Phase Identifier"] = parsed["Phase Identifier"]
-            # details["RERA_Number"] = parsed["RERA_Number"]
-
-        if details:
-            result.append(details)
+        elif phase == "group":
+            details.pop("Phase Identifier")
+            result.setdefault(parsed["Phase Identifier"], []).append(details)
+            return
+    if details and isinstance(result, list):
+        result.append(details)
+
+
+def parse_section(text, spec):
+    """Parse one text cell according to a section spec (see BROCHURE etc. below)."""
+    mapping = spec["mapping"]
+    skip = spec.get("skip", NULL_VALUES)
+    clean = spec.get("clean")
+    strict = spec.get("strict", False)
+    reset = spec.get("reset", True)
+    shape = spec.get("shape", "list")
+
+    result = {} if shape == "by_phase" else []
+    details = {}
+    current = None
+    for block_no, key, val in tokenize_blocks(str(text), spec.get("split")):
+        if block_no != current:
+            if current is not None and shape != "record":
+                _finish_block(details, spec, result)
+            current = block_no
+            if reset:
+                details = {}
+        if clean:
+            val = clean(val)
+        if val in skip:
+            continue
+        if key not in mapping:
+            if strict:
+                raise KeyError(key)
+            continue
+        details[mapping[key]] = val
 
+    if shape == "record":
+        return details
+    if current is not None:
+        _finish_block(details, spec, result)
     return result
 
 
-def parse_tower_details(text):
+# Bump whenever parse_section or a spec below changes: it keys the parse cache
+PARSER_VERSION = 1
+
+BASIC_DETAILS = {"mapping": column_names, "shape": "record"}
+
+PHASE_BLOCKS = {
+    "mapping": column_names,
+    "split": PHASE_BLOCK_SPLIT,
+    "strict": True,
+    "phase": "merge",
+}
 
-    column_mapping = {
+BROCHURE = {
+    "mapping": {
+        "original": "Brochure Link",
+        "Source": "Brochure Source",
+        "phaseIdentifier": "Phase Identifier",
+    },
+    "split": PHASE_BLOCK_SPLIT,
+    "clean": strip_brackets,
+    "phase": "name",
+}
+
+TOWER_DETAILS = {
+    "mapping": {
         "phaseIdentifier": "Phase Identifier",
         "towerName": "Tower Name:",
         "totalFloorNo": "Total Floor No",
@@ -179,119 +253,40 @@ def parse_tower_details(text):
         "unitViewFacing": "Unit View Facing",
         "towerOpenSide": "Tower Open Side",
         "source": "Tower Details Source",
-    }
-
-    result = {}
-    blocks = re.split(r"(?=phaseIdentifier:)", text.strip())
-
-    for block in blocks:
-        block = block.strip()
-        if not block:
-            continue
-
-        details = {}
-        for line in block.splitlines():
-            if ":" in line:
-                key, val = line.split(":", 1)
-                key = key.strip()
-                val = val.strip()
-
-                if key in column_mapping and val not in ("", "null", "[]", None):
-                    details[column_mapping[key]] = val
-
-        if "Phase Identifier" in details:
-            parsed = parse_phase_identifier(details["Phase Identifier"])
-
-            if parsed["Phase Identifier"] not in result:
-                details.pop("Phase Identifier")
-                result[parsed["Phase Identifier"]] = [details]
-            else:
-                details.pop("Phase Identifier")
-                result[parsed["Phase Identifier"]].append(details)
-
-            # result["Phase Identifier"] = parsed["phaseIdentifier"]
-
-    return result
-
+    },
+    "split": PHASE_BLOCK_SPLIT,
+    "phase": "group",
+    "shape": "by_phase",
+}
 
-def parse_payment_plan(text):
-    column_mapping = {
+PAYMENT_PLAN = {
+    "mapping": {
         "original": "Payment Document Link",
         "Source": "Payment Document Source",
         "paymentPlanType:": "Payment Plan Type",
         "phaseIdentifier": "Phase Identifier",
-    }
-
-    blocks = re.split(r"(?=phaseIdentifier:)", text.strip())
-    result = []
-
-    # print(blocks)
-
-    details = {}
-
-    for block in blocks:
-        block = block.strip()
-        if not block:
-            continue
-
-        for line in block.splitlines():
-            if ":" in line:
-                key, val = line.split(":", 1)
-                key = key.strip()
-                # val = val.strip()
-                val = val.strip().split("?", 1)[0]
-
-                if key in column_mapping and val not in ("", "null", "[]", None):
-                    details[column_mapping[key]] = val
-
-        if "Phase Identifier" in details:
-            parsed = parse_phase_identifier(details["Phase Identifier"])
-            details["Phase Identifier"] = parsed["Phase Identifier"]
-
-        if details:
-            result.append(details)
-
-    return result
-
+    },
+    "split": PHASE_BLOCK_SPLIT,
+    "clean": strip_query,
+    "phase": "name",
+    # one dict is shared by all blocks of a cell, as the export has always had it
+    "reset": False,
+}
 
-def parse_oc_cc_certificate(text):
-    column_mapping = {
+OC_CC_CERTIFICATE = {
+    "mapping": {
         "original": "Certificate URL",
         "phaseIdentifier": "Phase Identifier",
         "source": "Certificate Source",
         "towerId": "Tower ID",
-    }
-
-    result = []
-    blocks = re.split(r"(?=phaseIdentifier:)", text.strip())
-
-    for block in blocks:
-        block = block.strip()
-        if not block:
-            continue
-
-        details = {}
-        for line in block.splitlines():
-            if ":" in line:
-                key, val = line.split(":", 1)
-                key = key.strip()
-                val = val.strip().split("?", 1)[0]
-
-                if key in column_mapping and val not in ("", "null", "[]", None):
-                    details[column_mapping[key]] = val
-
-        if "Phase Identifier" in details:
-            parsed = parse_phase_identifier(details["Phase Identifier"])
-            details["Phase Identifier"] = parsed["Phase Identifier"]
-
-        if details:
-            result.append(details)
-
-    return result
-
+    },
+    "split": PHASE_BLOCK_SPLIT,
+    "clean": strip_query,
+    "phase": "name",
+}
 
-def parse_options(text):
-    column_mapping = {
+OPTIONS = {
+    "mapping": {
         "areaUnit": "Options Area Unit",
         "bhk": "Options BHK",
         "builtupArea": "Options Builtup Area",
@@ -303,35 +298,13 @@ def parse_options(text):
         "plotArea": "Options Plot Area",
         "propertyType": "Options Property Type",
         "superArea": "Options Super Area",
-    }
-
-    result = []
-    blocks = re.split(r"(?=superArea:)", text.strip())
-
-    for block in blocks:
-        block = block.strip()
-        if not block:
-            continue
-
-        details = {}
-        for line in block.splitlines():
-            if ":" in line:
-                key, val = line.split(":", 1)
-                key = key.strip()
-                val = val.strip()
-
-                if key in column_mapping and val != "":
-                    details[column_mapping[key]] = val
-
-        if details:
-            result.append(details)
-
-    return result
-
-
-def parse_prices(text):
+    },
+    "split": OPTION_BLOCK_SPLIT,
+    "skip": EMPTY_VALUES,
+}
 
-    column_mapping = {
+PRICES = {
+    "mapping": {
         "comments": "Comments",
         "isallinclusive": "Is All Inclusive",
         "islaunchprice": "Is Launch Price",
@@ -341,93 +314,316 @@ def parse_prices(text):
         "source": "Price Source",
         "typeofprices": "Type of Prices",
         "visitoutcome": "Visit Outcome",
-    }
+    },
+    "split": PHASE_BLOCK_SPLIT,
+    "clean": strip_query,
+    "phase": "name",
+}
 
-    result = []
-    blocks = re.split(r"(?=phaseIdentifier:)", text.strip())
 
-    for block in blocks:
-        block = block.strip()
-        if not block:
-            continue
+def parse_basic_details(text):
+    return parse_section(text, BASIC_DETAILS)
 
-        details = {}
-        for line in block.splitlines():
-            if ":" in line:
-                key, val = line.split(":", 1)
-                key = key.strip()
-                val = val.strip().split("?", 1)[0]
 
-                if key in column_mapping and val not in ("", "null", "[]", None):
-                    details[column_mapping[key]] = val
+def parse_phase_blocks(text):
+    return parse_section(text, PHASE_BLOCKS)
+
 
-        if "Phase Identifier" in details:
-            parsed = parse_phase_identifier(details["Phase Identifier"])
-            details["Phase Identifier"] = parsed["Phase Identifier"]
+def parse_brochure(text):
+    return parse_section(text, BROCHURE)
 
-        if details:
-            result.append(details)
 
-    return result
+def parse_tower_details(text):
+    return parse_section(text, TOWER_DETAILS)
+
+
+def parse_payment_plan(text):
+    return parse_section(text, PAYMENT_PLAN)
+
+
+def parse_oc_cc_certificate(text):
+    return parse_section(text, OC_CC_CERTIFICATE)
+
+
+def parse_options(text):
+    return parse_section(text, OPTIONS)
+
+
+def parse_prices(text):
+    return parse_section(text, PRICES)
 
 
 def parse_urls(text):
+    return [val for _, _, val in tokenize_blocks(str(text))]
+
+
+# Text column -> parser, applied once per cell by process_data
+SECTION_PARSERS = {
+    "Basic Details": parse_basic_details,
+    "Phase & Construction Status": parse_phase_blocks,
+    "Brochure": parse_brochure,
+    "Payment Plan": parse_payment_plan,
+    "Tower Details": parse_tower_details,
+    "OC/CC Certificate": parse_oc_cc_certificate,
+    "Options Added": parse_options,
+    "Prices": parse_prices,
+}
 
-    result = []
 
-    for line in str(text).splitlines():
-        if ":" in line:
-            key, val = line.split(":", 1)
-            # key = key.strip()
-            val = val.strip()
-            result.append(val)
+# ----------------------------
+# Panel export input
+# ----------------------------
+PANEL_SKIPROWS = 1  # title row above the header in "Field New Panel Data.xlsx"
+
+
+def read_panel(path, skiprows=PANEL_SKIPROWS):
+    """Load a whole panel export (.xlsx, .csv or .parquet)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return pd.read_csv(path, skiprows=skiprows)
+    if ext == ".parquet":
+        return pd.read_parquet(path)
+    return pd.read_excel(path, skiprows=skiprows)
+
+
+def _dedupe_header(header):
+    """Name header cells the way pd.read_excel does ("Locality", "Locality.1", ...)."""
+    names = []
+    seen = {}
+    for i, name in enumerate(header):
+        name = f"Unnamed: {i}" if name is None else str(name)
+        base = name
+        while name in seen:
+            seen[base] += 1
+            name = f"{base}.{seen[base]}"
+        seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _excel_value(value):
+    # pd.read_excel reads empty cells as NaN and whole-number floats as ints
+    if value is None:
+        return np.nan
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
 
-    return result
 
+def _rows_to_frame(rows, header):
+    return pd.DataFrame(rows, columns=header)
+
+
+def iter_panel_batches(path, batch_size, skiprows=PANEL_SKIPROWS):
+    """
+    Yield the panel export as DataFrames of at most `batch_size` rows, so only one
+    batch of raw multiline text is held in memory at a time.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        yield from pd.read_csv(path, skiprows=skiprows, chunksize=batch_size)
+        return
+    if ext == ".parquet":
+        import pyarrow.parquet as pq
+
+        for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+            yield record_batch.to_pandas()
+        return
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        for _ in range(skiprows):
+            next(rows, None)
+        header = _dedupe_header(next(rows, ()))
+
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            row = list(row[: len(header)]) + [None] * (len(header) - len(row))
+            batch.append([_excel_value(value) for value in row])
+            if len(batch) >= batch_size:
+                yield _rows_to_frame(batch, header)
+                batch = []
+        if batch:
+            yield _rows_to_frame(batch, header)
+    finally:
+        workbook.close()
 
-def process_data(df):
-    df.rename(columns={"visitdate": "Visit Date"}, inplace=True)
 
-    df["XID"] = df.apply(create_xid, axis=1)
+# ----------------------------
+# Incremental watermark
+# ----------------------------
+def watermark_path(reference_path):
+    return os.path.splitext(reference_path)[0] + ".watermark.json"
 
-    df["Visit Date"] = pd.to_datetime(df["Visit Date"], errors="coerce").dt.strftime(
-        "%Y-%m-%d"
-    )
-    df["Modify Date"] = pd.to_datetime(df["Modify Date"], errors="coerce").dt.strftime(
-        "%Y-%m-%d %H:%M:%S"
-    )
-    df["ID"] = df.apply(generate_id, axis=1)
 
-    df.drop(columns=["User"], inplace=True)
+def load_watermark(path):
+    """
+    Last processed Modify Date and the XIDs modified at exactly that time
+    (None if there is no watermark or it cannot be read: everything is reparsed).
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            watermark = json.load(f)
+        watermark["modify_date"] = pd.Timestamp(watermark["modify_date"])
+        watermark["xids"] = list(watermark["xids"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return watermark
 
-    df["Basic Details"] = df["Basic Details"].astype(str).apply(parse_basic_details)
 
-    df["Phase & Construction Status"] = (
-        df["Phase & Construction Status"].astype(str).apply(parse_phase_blocks)
-    )
+def save_watermark(watermark, path):
+    if watermark is None:
+        return
+    state = {
+        "modify_date": watermark["modify_date"].strftime("%Y-%m-%d %H:%M:%S"),
+        "xids": sorted(watermark["xids"]),
+    }
 
-    df.rename(
-        columns={"Phase & Construction Status": "Phase And Construction Status"},
-        inplace=True,
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+
+    atomic_write(path, write)
+
+
+def rows_beyond_watermark(df, watermark):
+    """Raw panel rows modified after the watermark (or with no Modify Date)."""
+    modify_date = pd.to_datetime(df["Modify Date"], errors="coerce").dt.floor("s")
+    if watermark is None:
+        return pd.Series(True, index=df.index)
+    at_mark = (modify_date == watermark["modify_date"]) & ~create_xids(df).isin(
+        watermark["xids"]
     )
+    return modify_date.isna() | (modify_date > watermark["modify_date"]) | at_mark
+
+
+def advance_watermark(watermark, df):
+    """Move the watermark up to the newest Modify Date in `df`."""
+    modify_date = pd.to_datetime(df["Modify Date"], errors="coerce")
+    if modify_date.isna().all():
+        return watermark
+    latest = modify_date.max().floor("s")
+    xids = set(create_xids(df.loc[modify_date.dt.floor("s") == latest]))
+    if watermark is None or latest > watermark["modify_date"]:
+        return {"modify_date": latest, "xids": xids}
+    if latest == watermark["modify_date"]:
+        return {"modify_date": latest, "xids": set(watermark["xids"]) | xids}
+    return watermark
+
+
+def affected_xids(batches, watermark):
+    """XIDs with at least one row beyond the watermark; all their rows get reparsed."""
+    xids = set()
+    for batch in batches:
+        xids.update(create_xids(batch)[rows_beyond_watermark(batch, watermark)])
+    return xids
+
+
+def spool_affected_xids(batches, watermark):
+    """
+    affected_xids for streamed batches in a single read of the panel export:
+    each batch is pickled to a temporary folder as it is scanned, and the
+    returned generator replays them from there (removing the folder when done).
+    """
+    folder = tempfile.mkdtemp(prefix="panel_spool_")
+    try:
+        xids = set()
+        paths = []
+        for batch in batches:
+            xids.update(create_xids(batch)[rows_beyond_watermark(batch, watermark)])
+            paths.append(os.path.join(folder, f"{len(paths):06d}.pkl"))
+            batch.to_pickle(paths[-1])
+    except BaseException:
+        shutil.rmtree(folder, ignore_errors=True)
+        raise
+    return xids, _replay_spool(paths, folder)
+
+
+def _replay_spool(paths, folder):
+    try:
+        for path in paths:
+            batch = pd.read_pickle(path)
+            os.remove(path)
+            yield batch
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+# Smaller chunks than one per worker keep the pool balanced on uneven rows
+CHUNKS_PER_WORKER = 4
+
+
+def process_data(df, workers=1):
+    """
+    Parse the raw panel export. With workers > 1 the rows are split into chunks
+    that are parsed in a process pool and put back together in their original order.
+    """
+    return _map_chunks(_process_data_serial, df, workers, pd.concat)
+
+
+def _map_chunks(func, df, workers, combine):
+    """Run `func` on row chunks of `df` in a process pool and `combine` the results."""
+    if workers <= 1 or len(df) < 2:
+        return func(df)
+
+    n_chunks = min(len(df), workers * CHUNKS_PER_WORKER)
+    bounds = np.linspace(0, len(df), n_chunks + 1, dtype=int)
+    chunks = [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(partial(_process_chunk, func), chunks))
+
+    for _, hits, misses, parse_stats in results:
+        _worker_cache_stats["hits"] += hits
+        _worker_cache_stats["misses"] += misses
+        for name, count in parse_stats.items():
+            parse_cache_stats[name] += count
+
+    return combine([result for result, _, _, _ in results])
+
+
+def _process_chunk(func, chunk):
+    """Worker entry point: parse one chunk and report its cache usage."""
+    before = _parse_phase_identifier.cache_info()
+    parse_before = dict(parse_cache_stats)
+    result = func(chunk.copy())
+    after = _parse_phase_identifier.cache_info()
+    parse_stats = {
+        name: count - parse_before[name] for name, count in parse_cache_stats.items()
+    }
+    return result, after.hits - before.hits, after.misses - before.misses, parse_stats
+
 
-    # df.drop(columns=["Phase & Construction Status"], inplace=True)
+def _prepare_rows(df):
+    """Add XID and ID and normalize the dates of raw panel rows (in place)."""
+    df.rename(columns={"visitdate": "Visit Date"}, inplace=True)
 
-    df["Brochure"] = df["Brochure"].astype(str).apply(parse_brochure)
+    df["XID"] = create_xids(df)
 
-    df["Payment Plan"] = df["Payment Plan"].astype(str).apply(parse_payment_plan)
+    visit_date = pd.to_datetime(df["Visit Date"], errors="coerce")
+    modify_date = pd.to_datetime(df["Modify Date"], errors="coerce")
+    df["Visit Date"] = visit_date.dt.strftime("%Y-%m-%d")
+    df["Modify Date"] = modify_date.dt.strftime("%Y-%m-%d %H:%M:%S")
+    df["ID"] = generate_ids(df["XID"], visit_date, modify_date)
 
-    df["Tower Details"] = df["Tower Details"].astype(str).apply(parse_tower_details)
+    df.drop(columns=["User"], inplace=True)
 
-    df["OC/CC Certificate"] = (
-        df["OC/CC Certificate"].astype(str).apply(parse_oc_cc_certificate)
-    )
-    # df.to_excel("test.xlsx", index=False)
 
-    df["Options Added"] = df["Options Added"].astype(str).apply(parse_options)
-    # df.to_excel("test.xlsx", index=False)
+def _process_data_serial(df):
+    _prepare_rows(df)
 
-    df["Prices"] = df["Prices"].astype(str).apply(parse_prices)
+    for column, parser in SECTION_PARSERS.items():
+        df[column] = df[column].astype(str).apply(parser)
+
+    df.rename(
+        columns={"Phase & Construction Status": "Phase And Construction Status"},
+        inplace=True,
+    )
 
     df.rename(columns={"Project": "Project Images"}, inplace=True)
     df["Project Images"] = df["Project Images"].astype(str).apply(parse_urls)
@@ -448,6 +644,442 @@ def process_data(df):
     return df
 
 
+# ----------------------------
+# Child tables
+# ----------------------------
+# Child table -> (panel column, section spec); every parsed item becomes a row
+CHILD_TABLES = {
+    "basic_details": ("Basic Details", BASIC_DETAILS),
+    "phases": ("Phase & Construction Status", PHASE_BLOCKS),
+    "brochures": ("Brochure", BROCHURE),
+    "payment_plans": ("Payment Plan", PAYMENT_PLAN),
+    "towers": ("Tower Details", TOWER_DETAILS),
+    "certificates": ("OC/CC Certificate", OC_CC_CERTIFICATE),
+    "options": ("Options Added", OPTIONS),
+    "prices": ("Prices", PRICES),
+}
+
+CHILD_KEYS = ["Row", "ID", "XID", "Item"]
+
+# Column -> dtype given right after parsing (see apply_schema); others stay text
+COLUMN_SCHEMA = {
+    # measures (anything unparseable becomes NaN)
+    "Open Area": "number",
+    "Unit Count": "number",
+    "Total Area": "number",
+    "Green Area": "number",
+    "Floor Count": "number",
+    "Tower Count": "number",
+    "Latitude": "number",
+    "Longitude": "number",
+    "Saleable Area": "number",
+    "Total Floor No": "number",
+    "Lift Count": "number",
+    "Minimum Unit Per Floor Count": "number",
+    "Maximum Unit Per Floor Count": "number",
+    "Options Builtup Area": "number",
+    "Options Carpet Area": "number",
+    "Options Plot Area": "number",
+    "Options Super Area": "number",
+    # dates (anything unparseable becomes NaT)
+    "Visit Date": "date",
+    "Modify Date": "date",
+    "Completion Date": "date",
+    "Launch Date": "date",
+    # true / false
+    "Options Is Invalid": "flag",
+    "Options Is New": "flag",
+    "Is All Inclusive": "flag",
+    "Is Launch Price": "flag",
+    # repeated labels
+    "ID": "category",
+    "XID": "category",
+    "rescom": "category",
+    "City": "category",
+    "Locality": "category",
+    "Phase Identifier": "category",
+    "RERA Number": "category",
+    "Possession Status": "category",
+    "Construction Status": "category",
+    "Project Details Sources": "category",
+    "Sources": "category",
+    "Brochure Source": "category",
+    "Payment Plan Type": "category",
+    "Payment Document Source": "category",
+    "Property Type": "category",
+    "BHK Config": "category",
+    "Unit Entrance Facing": "category",
+    "Unit View Facing": "category",
+    "Tower Open Side": "category",
+    "Tower Details Source": "category",
+    "Tower ID": "category",
+    "Certificate Source": "category",
+    "Options Area Unit": "category",
+    "Options BHK": "category",
+    "Options Property Type": "category",
+    "Price Category": "category",
+    "Price Source": "category",
+    "Type of Prices": "category",
+    "Visit Outcome": "category",
+}
+
+# A "category" column is only converted while it repeats enough to save memory
+MAX_CATEGORY_RATIO = 0.5
+
+FLAG_VALUES = {"true": True, "false": False, "1": True, "0": False}
+
+
+def _to_flag(series):
+    text = series.astype(str).str.strip().str.lower()
+    return text.map(FLAG_VALUES).astype("boolean")
+
+
+def apply_schema(df, schema=COLUMN_SCHEMA):
+    """Give the columns named in `schema` native dtypes (a typed copy of `df`)."""
+    df = df.copy()
+    for col in df.columns.intersection(list(schema)):
+        kind = schema[col]
+        series = df[col]
+        if kind == "number":
+            df[col] = pd.to_numeric(series, errors="coerce")
+        elif kind == "date":
+            df[col] = pd.to_datetime(series, errors="coerce", format="mixed")
+        elif kind == "flag":
+            df[col] = _to_flag(series)
+        elif kind == "category":
+            if series.nunique() <= MAX_CATEGORY_RATIO * len(series):
+                df[col] = series.astype("category")
+    return df
+
+
+def frame_memory_mb(frames):
+    """Deep memory footprint of one DataFrame or a dict of them, in MB."""
+    if isinstance(frames, dict):
+        return sum(frame_memory_mb(frame) for frame in frames.values())
+    return frames.memory_usage(deep=True).sum() / 2**20
+
+
+def type_tables(tables, schema=COLUMN_SCHEMA):
+    return {name: apply_schema(table, schema) for name, table in tables.items()}
+
+
+def section_columns(spec):
+    """Field columns a section spec can produce, in mapping order."""
+    columns = list(dict.fromkeys(spec["mapping"].values()))
+    if spec.get("phase") == "merge":
+        columns.append("RERA Number")
+    if spec.get("phase") == "group" and "Phase Identifier" not in columns:
+        columns.insert(0, "Phase Identifier")
+    return columns
+
+
+def _section_items(parsed, spec):
+    """The item dicts of one parse_section result, whatever the spec's shape."""
+    shape = spec.get("shape", "list")
+    if shape == "record":
+        return [parsed] if parsed else []
+    if shape == "by_phase":
+        return [
+            {"Phase Identifier": phase, **details}
+            for phase, items in parsed.items()
+            for details in items
+        ]
+    return parsed
+
+
+def parse_cells(texts, spec, section, cache=None):
+    """
+    parse_section for every text, parsing each distinct text once and taking
+    what it can from the on-disk `cache` (a ParseCache) when one is given.
+    """
+    distinct = pd.unique(texts)
+    results = cache.get_many(section, distinct) if cache is not None else {}
+    parsed = {
+        text: parse_section(text, spec) for text in distinct if text not in results
+    }
+    if cache is not None and parsed:
+        cache.put_many(section, parsed)
+    results.update(parsed)
+    return [results[text] for text in texts]
+
+
+def section_table(texts, spec, ids, xids, section=None, cache=None):
+    """
+    Parse one text column into a long table: one row per parsed item, keyed by
+    the panel row label, ID, XID and the item's position within its cell.
+    """
+    texts = texts.astype(str)
+    results = parse_cells(texts.to_numpy(), spec, section, cache)
+    rows, items, records = [], [], []
+    for row, result in zip(texts.index, results):
+        for item, details in enumerate(_section_items(result, spec)):
+            rows.append(row)
+            items.append(item)
+            records.append(details)
+
+    table = pd.DataFrame.from_records(records, columns=section_columns(spec))
+    table.insert(0, "Row", np.asarray(rows, dtype=np.int64))
+    table.insert(1, "ID", ids.loc[rows].to_numpy())
+    table.insert(2, "XID", xids.loc[rows].to_numpy())
+    table.insert(3, "Item", np.asarray(items, dtype=np.int32))
+    return table
+
+
+def process_tables(
+    df, workers=1, schema=COLUMN_SCHEMA, cache_path=None, cache_size=MAX_ENTRIES
+):
+    """
+    Parse the raw panel export into normalized tables instead of nested cells:
+    "rows" holds one row per panel row (without the parsed sections) and each
+    CHILD_TABLES entry one row per parsed item, all keyed by Row / ID / XID.
+    Columns are typed by `schema` once the chunks are put together (None keeps
+    the parsed text). With `cache_path`, cells parsed on earlier runs are read
+    from that ParseCache file instead of being parsed again.
+    """
+    func = partial(_process_tables_serial, cache_path=cache_path, cache_size=cache_size)
+    tables = _map_chunks(func, df, workers, concat_tables)
+    return type_tables(tables, schema) if schema else tables
+
+
+def _process_tables_serial(df, cache_path=None, cache_size=MAX_ENTRIES):
+    _prepare_rows(df)
+    cache = None
+    if cache_path:
+        cache = ParseCache(cache_path, PARSER_VERSION, max_entries=cache_size)
+    try:
+        tables = {
+            name: section_table(
+                df[column], spec, df["ID"], df["XID"], section=name, cache=cache
+            )
+            for name, (column, spec) in CHILD_TABLES.items()
+        }
+    finally:
+        if cache is not None:
+            cache.close()
+    sections = [column for column, _ in CHILD_TABLES.values()]
+    rows = df.drop(columns=sections).rename_axis("Row").reset_index()
+    return {"rows": rows, **tables}
+
+
+def concat_tables(parts):
+    """Stack the tables of several chunks (or batches) name by name."""
+    return {
+        name: pd.concat([part[name] for part in parts], ignore_index=True)
+        for name in parts[0]
+    }
+
+
+def _nested_items(cell):
+    """The dict items of a parsed cell: the dict itself or the dicts in a list."""
+    if isinstance(cell, dict):
+        return [cell]
+    if isinstance(cell, list):
+        return [item for item in cell if isinstance(item, dict)]
+    return []
+
+
+def flatten_and_merge_columns(df, columns_to_flatten, dedup_key=None):
+    """
+    Flatten columns containing dicts or lists of dicts into common columns,
+    merging all keys together: every nested item becomes one row carrying the
+    base columns of its source row; rows without items are kept once.
+    """
+    df = df.reset_index(drop=True)
+    flatten = [col for col in columns_to_flatten if col in df.columns]
+
+    # --- Explode every nested column to one item per row, in column order ---
+    parts = []
+    for order, col in enumerate(flatten):
+        items = df[col].map(_nested_items).explode().dropna()
+        parts.append(
+            pd.DataFrame({"row": items.index, "order": order, "item": items.values})
+        )
+    exploded = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    if exploded.empty:
+        return df.loc[:, ~df.columns.duplicated()]
+    exploded = exploded.sort_values(["row", "order"], kind="stable")
+
+    # --- Repeat base rows once per item (at least once) ---
+    rows = exploded["row"].to_numpy()
+    repeats = np.maximum(np.bincount(rows, minlength=len(df)), 1)
+    base = df.iloc[np.repeat(np.arange(len(df)), repeats)].reset_index(drop=True)
+
+    # --- Normalize items into columns aligned with their output rows ---
+    starts = np.cumsum(repeats) - repeats
+    positions = starts[rows] + exploded.groupby("row").cumcount().to_numpy()
+    item_df = pd.DataFrame(exploded["item"].tolist(), index=positions)
+    item_df = item_df.reindex(base.index)
+
+    # ✅ No deduplication — keep every merged item; item keys win over base keys
+    overlap = [col for col in item_df.columns if col in base.columns]
+    for col in overlap:
+        base[col] = item_df[col].where(item_df[col].notna(), base[col])
+    added = item_df.drop(columns=overlap)
+
+    flat_df = pd.concat([base, added], axis=1).infer_objects()
+    flat_df = flat_df.loc[:, ~flat_df.columns.duplicated()]  # remove duplicate columns
+    return flat_df
+
+
+def expand_url_columns(df, url_columns, max_urls=None):
+    """
+    Expand list-type URL columns into separate columns with counter suffix,
+    keeping at most `max_urls` per column when a cap is given.
+    """
+    expanded = []
+    for col in url_columns:
+        lists = [x if isinstance(x, list) else [] for x in df[col]]
+
+        # Find max number of URLs in this column
+        width = max(map(len, lists), default=0)
+        if max_urls is not None:
+            width = min(width, max_urls)
+
+        # Build col_1, col_2, ... from one padded list-of-lists
+        padded = [urls[:width] + [None] * (width - len(urls)) for urls in lists]
+        expanded.append(
+            pd.DataFrame(
+                padded,
+                index=df.index,
+                columns=[f"{col}_{i+1}" for i in range(width)],
+                dtype=object,
+            )
+        )
+
+    # Drop original columns and attach all expanded ones at once
+    return pd.concat([df.drop(columns=url_columns), *expanded], axis=1)
+
+
+# Columns to flatten (these are your parsed dict/list columns)
+COLUMNS_TO_FLATTEN = [
+    "Basic Details",
+    "Phase And Construction Status",
+    "Brochure",
+    "Payment Plan",
+    "Options Added",
+    "OC/CC Certificate",
+    "Prices",
+]
+
+# URL columns to expand
+URL_COLUMNS = ["Project Images", "Video URL"]
+MAX_EXPANDED_URLS = None  # e.g. 10 to keep only the first ten URLs per column
+
+DROP_AFTER_FLATTEN = [
+    "Basic Details",
+    "Phase And Construction Status",
+    "Brochure",
+    "Payment Plan",
+    "Prices",
+    "Tower Details",
+    "Prices",
+    "Locality.1",
+    "Raw Video",
+    # "Video URL",
+    "Amenity (In Brochure)",
+    "Amenities Added",
+    "Options (In Brochure)",
+    "Additional Details",
+    "Additional Comments",
+    "Info Not Available",
+    "Options Added",
+    "OC/CC Certificate",
+]
+
+NUM_COLS = ["Total Area", "Open Area", "Floor Count", "Tower Count"]
+SELECTED_COLUMNS = ["XID", *NUM_COLS, "Brochure Link"]
+
+
+def select_columns(df_xl):
+    """Flatten a processed batch and keep the XID-level columns we track."""
+    # Flatten and merge, deduplicating on 'Phase Identifier'
+    df_flat = flatten_and_merge_columns(
+        df_xl, COLUMNS_TO_FLATTEN, dedup_key="Phase Identifier"
+    )
+
+    print("Flattened DataFrame : ", df_flat.shape)
+
+    # Apply after flattening
+    df_flat = expand_url_columns(df_flat, URL_COLUMNS, max_urls=MAX_EXPANDED_URLS)
+    df_flat.drop(columns=DROP_AFTER_FLATTEN, inplace=True)
+
+    # # Save result
+    # df_flat.to_excel("flattened_data.xlsx", index=False)
+    # # selected_columns = df_flat[
+    # #     df_flat["XID", "Total Area", "Open Area", "Floor Count", "Tower Count"]
+    # # ]
+
+    # Step 1: Select columns
+    # (a small batch may not mention every field at all)
+    selected_columns = df_flat.reindex(columns=SELECTED_COLUMNS)
+
+    # Step 2: Convert numeric columns to numbers
+    selected_columns[NUM_COLS] = selected_columns[NUM_COLS].apply(
+        pd.to_numeric, errors="coerce"
+    )
+    return selected_columns
+
+
+# Child tables in the order select_columns meets their items (COLUMNS_TO_FLATTEN)
+FLATTENED_TABLES = [
+    "basic_details",
+    "phases",
+    "brochures",
+    "payment_plans",
+    "options",
+    "certificates",
+    "prices",
+]
+
+
+def select_columns_from_tables(tables):
+    """
+    The rows select_columns() would keep, built from the child tables without
+    flattening: each item carrying a tracked field becomes one row, ordered by
+    panel row, section and item as the flatten does, plus an empty row per
+    panel row so every XID still shows up in combine_links.
+    """
+    fields = SELECTED_COLUMNS[1:]
+    parts = [tables["rows"][["Row", "XID"]].assign(Section=-1, Item=-1)]
+    for section, name in enumerate(FLATTENED_TABLES):
+        table = tables[name]
+        present = [col for col in fields if col in table.columns]
+        if not present or table.empty:
+            continue
+        part = table.dropna(subset=present, how="all")
+        parts.append(part[["Row", "XID", "Item", *present]].assign(Section=section))
+
+    selected = pd.concat(parts, ignore_index=True)
+    selected = selected.sort_values(["Row", "Section", "Item"], kind="stable")
+    selected = selected.reindex(columns=SELECTED_COLUMNS).reset_index(drop=True)
+    selected["XID"] = selected["XID"].astype(object)
+    selected[NUM_COLS] = selected[NUM_COLS].apply(pd.to_numeric, errors="coerce")
+    return selected
+
+
+def concat_selected(parts):
+    if not parts:
+        return pd.DataFrame(columns=SELECTED_COLUMNS)
+    return pd.concat(parts, ignore_index=True)
+
+
+def combine_links(selected_columns):
+    """
+    One row per XID: the first non-null value of each numeric column and the
+    unique brochure links joined with ", " (NaN when there are none).
+    """
+    grouped = selected_columns.groupby("XID")
+    numeric_data = grouped[NUM_COLS].first()
+
+    # Combine unique brochure links, drop blanks
+    links = selected_columns.dropna(subset=["Brochure Link"]).drop_duplicates(
+        subset=["XID", "Brochure Link"]
+    )
+    combined_link = links.groupby("XID")["Brochure Link"].agg(", ".join)
+
+    return numeric_data.join(combined_link).reset_index()
+
+
 #   #######################################################################
 
 
@@ -628,233 +1260,428 @@ def safe_eval(value):
     return value
 
 
-def compare_dataframes(df_db, df_xl):
+def compare_dataframes(df_db, df_xl, fingerprints=None):
     key = "XID"
 
+    df_xl = df_xl.drop_duplicates(subset=key, keep="first")
+
+    # --- Fast path: look up stored fingerprints instead of the reference rows ---
+    if can_use_fingerprints(fingerprints, df_xl):
+        stored = df_xl[key].astype(str).map(fingerprints["fingerprints"])
+        current = row_fingerprints(df_xl, fingerprints["columns"])
+        is_new = stored.isna()
+        changed = ~is_new & (stored != current)
+        return pd.concat([df_xl.loc[is_new], df_xl.loc[changed]], ignore_index=True)
+
+    if df_db is None:
+        raise ValueError("df_db is required without a usable fingerprint index")
+
     # --- Align columns ---
     common_cols = sorted(list(set(df_db.columns) & set(df_xl.columns)))
+    common_cols = [col for col in common_cols if col != key]
 
-    ids_db = set(df_db[key]) if not df_db.empty else set()
-    ids_xl = set(df_xl[key])
-
-    new_ids = ids_xl - ids_db  # only in Excel
-    existing_ids = ids_db & ids_xl  # common IDs
+    # --- Index both sides on XID (first occurrence wins, as before) ---
+    if df_db.empty:
+        return df_xl.reset_index(drop=True)
+    db_indexed = df_db.drop_duplicates(subset=key, keep="first").set_index(key)
 
-    new_records = []
-    updated_records = []
+    is_new = ~df_xl[key].isin(db_indexed.index)
 
     # --- Case 1: New records (only in Excel) ---
-    for id_ in new_ids:
-        row = df_xl.loc[df_xl[key] == id_].iloc[0].to_dict()
-        new_records.append(row)
-
-    # --- Case 2: Existing IDs → compare field by field ---
-    for id_ in existing_ids:
-        old_row = df_db.loc[df_db[key] == id_].iloc[0].to_dict()
-        new_row = df_xl.loc[df_xl[key] == id_].iloc[0].to_dict()
-
-        updated = False
-        for col in common_cols:
-            old_val = safe_eval(old_row.get(col))
-            new_val = safe_eval(new_row.get(col))
-            if old_val != new_val:
-                updated = True
-                break
-
-        if updated:
-            updated_records.append(new_row)
+    new_df = df_xl.loc[is_new]
+
+    # --- Case 2: Existing IDs → compare column by column ---
+    existing_df = df_xl.loc[~is_new]
+    old_df = db_indexed.reindex(existing_df[key])
+
+    changed = np.zeros(len(existing_df), dtype=bool)
+    for col in common_cols:
+        old_vals = normalize_na(old_df[col])
+        new_vals = normalize_na(existing_df[col])
+        changed |= (old_vals != new_vals).astype(bool)
+
+    updated_df = existing_df.loc[changed]
 
     # --- Combine new and updated rows vertically ---
-    merged_df = pd.concat(
-        [pd.DataFrame(new_records), pd.DataFrame(updated_records)], ignore_index=True
-    )
+    merged_df = pd.concat([new_df, updated_df], ignore_index=True)
 
     # --- Optional: save to Excel ---
-    # pd.DataFrame(new_records).to_excel("new_records.xlsx", index=False)
-    # pd.DataFrame(updated_records).to_excel("updated_records.xlsx", index=False)
+    # new_df.to_excel("new_records.xlsx", index=False)
+    # updated_df.to_excel("updated_records.xlsx", index=False)
     # merged_df.to_excel("merged_df.xlsx", index=False)
 
     return merged_df
 
 
-def main():
+CHANGE_LOG_COLUMNS = ["XID", "Column", "Old", "New", "Change"]
 
-    new_data_path = "C:/Users/abhishek.k11/Desktop/Projects/Project-8 (Sonia M.)/src/Umesh/data/Field New Panel Data.xlsx"
-    old_data_path = "C:/Users/abhishek.k11/Desktop/Projects/Project-8 (Sonia M.)/src/Umesh/incremental_data/Reference_DB_Data.xlsx"
-    df = pd.read_excel(new_data_path, skiprows=1)
-    df_db = pd.read_excel(
-        old_data_path,
-        keep_default_na=False,
-    )
-    # df = df.head(100)
-    # df["Project Name"] = df.apply(
-    #     lambda x: f"{x["Project Name"].strip()} Updated Today ({datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')})",
-    #     axis=1,
-    # )
 
-    df_xl = process_data(df)
-    # df_db = pd.read_excel(old_data_path)
+def column_changes(df_db, df_xl, key="XID", keep="first"):
+    """
+    Long-format change log with one (XID, Column, Old, New, Change) row per
+    field that differs from the reference DB. Values are compared the way
+    compare_dataframes does (first reference row per XID, NA-likes equal) but
+    reported as stored; keep="last" compares with the latest row instead.
+    XIDs that are not in the reference yet list each non-NA field as "insert".
+    """
+    df_xl = df_xl.drop_duplicates(subset=key, keep="first").reset_index(drop=True)
+    if df_db is None or df_db.empty:
+        db_indexed = pd.DataFrame(index=pd.Index([], name=key))
+    else:
+        db_indexed = df_db.drop_duplicates(subset=key, keep=keep).set_index(key)
 
-    # print(df_xl["Project Name"].head(10))
+    is_new = ~df_xl[key].isin(db_indexed.index).to_numpy()
+    old_df = db_indexed.reindex(df_xl[key])
+    xids = df_xl[key].to_numpy()
+    no_values = np.full(len(df_xl), None, dtype=object)
 
-    def flatten_and_merge_columns(df, columns_to_flatten, dedup_key=None):
-        """
-        Flatten columns containing dicts or lists of dicts into common columns,
-        merging all keys together, and deduplicating based on dedup_key.
-        """
-        flattened_rows = []
-
-        for idx, row in df.iterrows():
-            base_data = row.drop(columns=columns_to_flatten, errors="ignore").to_dict()
-            merged_items = []
-
-            for col in columns_to_flatten:
-                cell = row.get(col)
-                if isinstance(cell, dict):
-                    merged_items.append(cell)
-                elif isinstance(cell, list):
-                    for item in cell:
-                        if isinstance(item, dict):
-                            merged_items.append(item)
-
-            # # Deduplicate merged items based on dedup_key
-            # seen_keys = set()
-            # if merged_items:
-            #     for item in merged_items:
-            #         if dedup_key and dedup_key in item:
-            #             key_val = item[dedup_key]
-            #             if key_val in seen_keys:
-            #                 continue
-            #             seen_keys.add(key_val)
-            #         flattened_rows.append({**base_data, **item})
-            # else:
-            #     flattened_rows.append(base_data)
-
-            # ✅ No deduplication — keep every merged item
-            if merged_items:
-                for item in merged_items:
-                    flattened_rows.append({**base_data, **item})
-            else:
-                flattened_rows.append(base_data)
-
-        flat_df = pd.DataFrame(flattened_rows)
-        flat_df = flat_df.loc[
-            :, ~flat_df.columns.duplicated()
-        ]  # remove duplicate columns
-        return flat_df
-
-    def expand_url_columns(df, url_columns):
-        """
-        Expand list-type URL columns into separate columns with counter suffix.
-        """
-        for col in url_columns:
-            # Find max number of URLs in this column
-            max_len = (
-                df[col].apply(lambda x: len(x) if isinstance(x, list) else 0).max()
+    # --- One vectorized comparison per column ---
+    parts = []
+    for col in df_xl.columns:
+        if col == key:
+            continue
+        new_vals = normalize_na(df_xl[col])
+        if col in old_df.columns:
+            differs = (normalize_na(old_df[col]) != new_vals).astype(bool)
+            old_vals = old_df[col].to_numpy(dtype=object)
+        else:
+            # not tracked in the reference DB: only reported for new XIDs
+            differs = is_new & (new_vals != None)  # noqa: E711
+            old_vals = no_values
+        new_vals = df_xl[col].to_numpy(dtype=object)
+        if not differs.any():
+            continue
+        rows = np.flatnonzero(differs)
+        parts.append(
+            pd.DataFrame(
+                {
+                    key: xids[rows],
+                    "Column": col,
+                    "Old": old_vals[rows],
+                    "New": new_vals[rows],
+                    "Change": np.where(is_new[rows], "insert", "update"),
+                    "_row": rows,
+                }
             )
+        )
 
-            # Create new columns: col_1, col_2, ...
-            for i in range(max_len):
-                new_col = f"{col}_{i+1}"
-                df[new_col] = df[col].apply(
-                    lambda x: x[i] if isinstance(x, list) and len(x) > i else None
-                )
+    if not parts:
+        return pd.DataFrame(columns=CHANGE_LOG_COLUMNS)
+    changes = pd.concat(parts, ignore_index=True)
+    changes = changes.sort_values("_row", kind="stable")
+    return changes.drop(columns="_row").reset_index(drop=True)
 
-            # Drop original column
-            df.drop(columns=[col], inplace=True)
 
-        return df
+NEW_DATA_PATH = "C:/Users/abhishek.k11/Desktop/Projects/Project-8 (Sonia M.)/src/Umesh/data/Field New Panel Data.xlsx"
+OLD_DATA_PATH = "C:/Users/abhishek.k11/Desktop/Projects/Project-8 (Sonia M.)/src/Umesh/incremental_data/Reference_DB_Data.xlsx"
 
-    # Columns to flatten (these are your parsed dict/list columns)
-    columns_to_flatten = [
-        "Basic Details",
-        "Phase And Construction Status",
-        "Brochure",
-        "Payment Plan",
-        "Options Added",
-        "OC/CC Certificate",
-        "Prices",
-    ]
 
-    # Flatten and merge, deduplicating on 'Phase Identifier'
-    df_flat = flatten_and_merge_columns(
-        df_xl, columns_to_flatten, dedup_key="Phase Identifier"
-    )
+ENGINES = ["pandas", "polars"]
 
-    print("Flattened DataFrame : ", df_flat.shape)
-    # URL columns to expand
-    url_columns = ["Project Images", "Video URL"]
 
-    # Apply after flattening
-    df_flat = expand_url_columns(df_flat, url_columns)
-    df_flat.drop(
-        columns=[
-            "Basic Details",
-            "Phase And Construction Status",
-            "Brochure",
-            "Payment Plan",
-            "Prices",
-            "Tower Details",
-            "Prices",
-            "Locality.1",
-            "Raw Video",
-            # "Video URL",
-            "Amenity (In Brochure)",
-            "Amenities Added",
-            "Options (In Brochure)",
-            "Additional Details",
-            "Additional Comments",
-            "Info Not Available",
-            "Options Added",
-            "OC/CC Certificate",
-        ],
-        inplace=True,
-    )
+def load_engine(name):
+    """The pipeline steps run_export uses: this module's or polars_backend's."""
+    if name == "polars":
+        import polars_backend  # optional: needs polars
 
-    # # Save result
-    # df_flat.to_excel("flattened_data.xlsx", index=False)
-    # # selected_columns = df_flat[
-    # #     df_flat["XID", "Total Area", "Open Area", "Floor Count", "Tower Count"]
-    # # ]
+        return polars_backend
+    return SimpleNamespace(
+        process_tables=process_tables,
+        type_tables=type_tables,
+        frame_memory_mb=frame_memory_mb,
+        select_columns_from_tables=select_columns_from_tables,
+        concat_selected=concat_selected,
+        combine_links=combine_links,
+        compare_dataframes=compare_dataframes,
+    )
 
-    # Step 1: Select columns
-    selected_columns = df_flat[
-        [
-            "XID",
-            "Total Area",
-            "Open Area",
-            "Floor Count",
-            "Tower Count",
-            "Brochure Link",
-        ]
-    ].copy()
 
-    # Step 2: Convert numeric columns to numbers
-    num_cols = ["Total Area", "Open Area", "Floor Count", "Tower Count"]
-    selected_columns[num_cols] = selected_columns[num_cols].apply(
-        pd.to_numeric, errors="coerce"
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Field panel incremental processing")
+    parser.add_argument("--panel", default=NEW_DATA_PATH, help="Field panel export")
+    parser.add_argument(
+        "--reference", default=OLD_DATA_PATH, help="Reference_DB_Data.xlsx path"
+    )
+    parser.add_argument(
+        "--backend",
+        choices=REFERENCE_BACKENDS,
+        default="excel",
+        help="Reference DB storage (sqlite keeps one row per XID next to the workbook)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes used to parse the panel export (0 = one per CPU core)",
+    )
+    parser.add_argument(
+        "--no-snapshot",
+        action="store_true",
+        help="Always parse the reference workbook instead of its Arrow snapshot",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="pandas",
+        help="Run parsing, selection and the diff on pandas or Polars (needs polars)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=0,
+        help="Stream the panel export in batches of this many rows (0 = load it whole)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only reparse XIDs with rows modified after the last run's watermark",
+    )
+    parser.add_argument(
+        "--export-excel",
+        action="store_true",
+        help="Also write the reference DB out to a report workbook (see --export-path)",
+    )
+    parser.add_argument(
+        "--export-path",
+        default=None,
+        help="Report written by --export-excel (default: Reference_DB_Export.xlsx "
+        "next to the reference DB; never the reference workbook itself)",
+    )
+    parser.add_argument(
+        "--watch",
+        default=None,
+        help="Keep running and process every panel export that lands in this folder",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=10,
+        help="Seconds between checks of the --watch folder",
+    )
+    parser.add_argument(
+        "--parse-cache",
+        action="store_true",
+        help="Reuse section cells parsed on earlier runs (cached next to the reference DB)",
     )
+    parser.add_argument(
+        "--parse-cache-size",
+        type=int,
+        default=MAX_ENTRIES,
+        help="Parsed cells kept in the parse cache before the oldest are evicted",
+    )
+    parser.add_argument(
+        "--extra-formats",
+        nargs="+",
+        choices=OUTPUT_FORMATS[1:],
+        default=[],
+        help="Also write the incremental file (and change log) as CSV / Parquet",
+    )
+    parser.add_argument(
+        "--history",
+        action="store_true",
+        help="Add the incremental file to the history store (see history.py)",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="Record the tracemalloc peak of each stage in the run report (slower)",
+    )
+    parser.add_argument(
+        "--profile-dir",
+        default=None,
+        help="Dump a cProfile .prof file per stage into this folder",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Push new and updated rows to the field details API",
+    )
+    parser.add_argument("--api-url", default=FIELD_DETAILS_URL)
+    parser.add_argument(
+        "--sync-batch-size",
+        type=int,
+        default=SYNC_BATCH_SIZE,
+        help="Records per API request",
+    )
+    parser.add_argument(
+        "--sync-workers",
+        type=int,
+        default=1,
+        help="API requests in flight at once",
+    )
+    parser.add_argument(
+        "--partial-sync",
+        action="store_true",
+        help="Only send the fields of updated XIDs that differ from their latest "
+        "reference row to the API",
+    )
+    parser.add_argument(
+        "--change-log",
+        action="store_true",
+        help="Also write a Change_Log workbook of (XID, Column, Old, New) rows",
+    )
+    parser.add_argument(
+        "--reference-source",
+        choices=["store", "api"],
+        default="store",
+        help="Compare against the local reference DB or the API table (downloaded "
+        "in the background while the panel export is parsed)",
+    )
+    parser.add_argument("--fetch-page-size", type=int, default=FETCH_PAGE_SIZE)
+    parser.add_argument(
+        "--fetch-workers",
+        type=int,
+        default=4,
+        help="Reference pages downloaded at once",
+    )
+    args = parser.parse_args(argv)
+    if args.engine == "polars" and (args.workers != 1 or args.parse_cache):
+        parser.error(
+            "--workers and --parse-cache only apply to --engine pandas "
+            "(Polars parses on its own thread pool, without the parse cache)"
+        )
+    if args.export_path is None:
+        args.export_path = export_path(args.reference)
+    elif os.path.abspath(args.export_path) == os.path.abspath(args.reference):
+        parser.error("--export-path must not be the --reference workbook")
+    return args
 
-    # Step 3: Group by XID and handle duplicates
-    def combine_links(group):
-        # Combine unique brochure links, drop blanks
-        links = group["Brochure Link"].dropna().unique().tolist()
-        combined_link = ", ".join(links) if links else np.nan
 
-        # Keep the first non-null value for numeric columns
-        numeric_data = group[num_cols].bfill().iloc[0]
+def incremental_output_path(folder, unique=False):
+    """Incremental_Data_<date>.xlsx in `folder`; with unique, _2, _3, ... if taken."""
+    today = datetime.datetime.now().strftime("%Y-%m-%d")  # e.g. '2025-11-11'
+    path = os.path.join(folder, f"Incremental_Data_{today}.xlsx")
+    n = 2
+    while unique and os.path.exists(path):
+        path = os.path.join(folder, f"Incremental_Data_{today}_{n}.xlsx")
+        n += 1
+    return path
+
+
+def run_export(args, new_data_path, store=None, to_save=None):
+    """
+    Process one panel export end to end and return the incremental file written.
+    A `store` opened earlier is reused as is (watch mode keeps it loaded).
+    """
+    report = RunReport(trace_memory=args.trace_memory, profile_dir=args.profile_dir)
+    report.info.update(
+        backend=args.backend,
+        engine=args.engine,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        incremental=args.incremental,
+    )
+    # Cache counters are process-wide; this run reports its own share of them
+    phase_before = phase_identifier_cache_info()
+    parse_before = dict(parse_cache_stats)
+
+    # Start the API download first so it overlaps with parsing the panel export
+    reference_download = None
+    if args.reference_source == "api":
+        reference_download = start_reference_download(
+            args.api_url, page_size=args.fetch_page_size, concurrency=args.fetch_workers
+        )
 
-        return pd.Series(
-            [group["XID"].iloc[0], *numeric_data, combined_link],
-            index=["XID", *num_cols, "Brochure Link"],
+    old_data_path = args.reference
+    if args.batch_size:
+        batches = report.timed_iter(
+            "read_panel", iter_panel_batches(new_data_path, args.batch_size)
         )
+    else:
+        with report.stage("read_panel") as stage:
+            batches = [read_panel(new_data_path)]
+            stage["rows"] = len(batches[0])
+    if store is None:
+        with report.stage("open_reference"):
+            store = open_reference_store(
+                args.backend, old_data_path, snapshot=not args.no_snapshot
+            )
+    # df = df.head(100)
+    # df["Project Name"] = df.apply(
+    #     lambda x: f"{x["Project Name"].strip()} Updated Today ({datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')})",
+    #     axis=1,
+    # )
+
+    # df_db = pd.read_excel(old_data_path)
+
+    # print(df_xl["Project Name"].head(10))
 
-    cleaned_df = selected_columns.groupby("XID", as_index=False).apply(combine_links)
+    # Only XIDs touched since the last run are parsed in incremental mode
+    watermark_file = watermark_path(old_data_path)
+    watermark = load_watermark(watermark_file)
+    affected = None
+    if args.incremental and watermark is not None:
+        with report.stage("watermark_scan"):
+            if args.batch_size:
+                # the batches are read once here and replayed from a spool
+                affected, batches = spool_affected_xids(batches, watermark)
+            else:
+                affected = affected_xids(batches, watermark)
+        print(f"Incremental run : {len(affected)} XIDs changed since the watermark")
+
+    cache_path = parse_cache_path(old_data_path) if args.parse_cache else None
+    engine = load_engine(args.engine)
+
+    selected = []
+    for batch in batches:
+        watermark = advance_watermark(watermark, batch)
+        if affected is not None:
+            batch = batch.loc[create_xids(batch).isin(affected)]
+            if batch.empty:
+                continue
+        with report.stage("process_tables", rows=len(batch)):
+            tables = engine.process_tables(
+                batch,
+                workers=args.workers,
+                schema=None,
+                cache_path=cache_path,
+                cache_size=args.parse_cache_size,
+            )
+        print(
+            "Child tables : ",
+            ", ".join(f"{name} {len(table)}" for name, table in tables.items()),
+        )
+        with report.stage("apply_schema"):
+            memory_before = engine.frame_memory_mb(tables)
+            tables = engine.type_tables(tables)
+            memory_after = engine.frame_memory_mb(tables)
+        print(f"Child tables memory : {memory_before:.1f} MB -> {memory_after:.1f} MB")
+        for key, value in (("before", memory_before), ("after", memory_after)):
+            key = f"tables_mb_{key}"
+            report.info[key] = round(report.info.get(key, 0) + value, 1)
+        with report.stage("select_columns") as stage:
+            selected.append(engine.select_columns_from_tables(tables))
+            stage["rows"] = stage.get("rows", 0) + len(selected[-1])
+
+    selected_columns = engine.concat_selected(selected)
 
-    # Step 4: Replace NaN with "NA" for export
-    cleaned_df = cleaned_df.replace({np.nan: "NA"})
+    # Step 3: Group by XID and handle duplicates
+    with report.stage("combine_links") as stage:
+        cleaned_df = engine.combine_links(selected_columns)
+
+        # Step 4: Replace NaN with "NA" for export
+        cleaned_df = cleaned_df.replace({np.nan: "NA"})
+        stage["rows"] = len(cleaned_df)
+
+    with report.stage("load_reference") as stage:
+        if reference_download is not None:
+            # only waits for whatever is still downloading
+            fingerprint_index = None
+            df_db = reference_download.result()
+        else:
+            fingerprint_index = store.fingerprints()
+            if not can_use_fingerprints(fingerprint_index, cleaned_df):
+                fingerprint_index = None
+            df_db = store.load() if fingerprint_index is None else None
+        stage["rows"] = len(
+            df_db if df_db is not None else fingerprint_index["fingerprints"]
+        )
 
-    new_data = compare_dataframes(df_db=df_db, df_xl=cleaned_df)
+    with report.stage("compare") as stage:
+        new_data = engine.compare_dataframes(
+            df_db=df_db, df_xl=cleaned_df, fingerprints=fingerprint_index
+        )
+        stage["rows"] = len(new_data)
 
     # Identify columns other than the ID
     non_id_cols = [c for c in new_data.columns if c != "XID"]
@@ -864,18 +1691,72 @@ def main():
         ~(new_data[non_id_cols].applymap(lambda x: x) == "NA").all(axis=1)
     ]
 
-    # Step 5: Export to Excel
-    updated_reference_db = pd.concat([df_db, new_data], ignore_index=True)
-    updated_reference_db = updated_reference_db.drop_duplicates(keep="last")
-    updated_reference_db.to_excel(old_data_path, index=False)
+    # Field-level changes of the flagged rows (old values need the reference rows)
+    change_log = None
+    partial_updates = None
+    if args.change_log or (args.sync and args.partial_sync):
+        with report.stage("change_log") as stage:
+            if df_db is None:
+                df_db = store.load()
+            if args.change_log:
+                change_log = column_changes(df_db, new_data)
+                stage["rows"] = len(change_log)
+            if args.sync and args.partial_sync:
+                # the API holds the row pushed last, which for the Excel store
+                # (several rows per XID) is not the first one diffed against
+                partial_updates = partial_update_records(
+                    column_changes(df_db, new_data, keep="last")
+                )
 
-    today = datetime.datetime.now().strftime("%Y-%m-%d")  # e.g. '2025-11-11'
+    # Step 5: Push changed rows to the field details API
+    to_store = new_data
+    if args.sync:
+        known_xids = (
+            set(fingerprint_index["fingerprints"])
+            if fingerprint_index is not None
+            else set(df_db["XID"].astype(str))
+        )
+        with report.stage("api_sync", rows=len(new_data)):
+            sync_summary = sync_records(
+                new_data,
+                known_xids,
+                url=args.api_url,
+                batch_size=args.sync_batch_size,
+                workers=args.sync_workers,
+                partial_updates=partial_updates,
+            )
+        report.info.update(sync_summary)
+        # Rows the API did not take stay out of the reference DB (and the
+        # watermark stays put) so the next run pushes them again
+        failed = sync_summary["failed_xids"]
+        if failed:
+            to_store = new_data.loc[~new_data["XID"].astype(str).isin(failed)]
+
+    # Step 6: Write changed rows to the reference DB
+    with report.stage("upsert", rows=len(to_store)):
+        store.upsert(to_store)
+    if args.export_excel:
+        with report.stage("export_excel"):
+            store.export_excel(args.export_path)
+    if not args.sync or not sync_summary["failed_xids"]:
+        save_watermark(watermark, watermark_file)
+
+    if to_save is None:
+        to_save = incremental_output_path(os.path.split(old_data_path)[0])
+    with report.stage("write_incremental", rows=len(new_data)):
+        write_outputs(new_data, to_save, args.extra_formats)
+    if args.change_log:
+        folder, name = os.path.split(to_save)
+        write_outputs(
+            change_log,
+            os.path.join(folder, name.replace("Incremental_Data_", "Change_Log_", 1)),
+            args.extra_formats,
+        )
+    if args.history:
+        from history import HistoryStore, history_path  # optional: needs pyarrow
 
-    to_save = os.path.join(
-        os.path.split(old_data_path)[0],
-        f"Incremental_Data_{today}.xlsx",
-    )
-    new_data.to_excel(to_save, index=False)
+        with report.stage("history", rows=len(new_data)):
+            HistoryStore(history_path(os.path.split(to_save)[0])).ingest(to_save)
 
     # post_data_json, put_data_json = compare_dataframes(df_db=df_db, df_xl=df_xl)
     # print("\n---------------------------------------------------------")
@@ -887,6 +1768,157 @@ def main():
     # print(put_data_json)
     # print("\n---------------------------------------------------------\n")
 
+    # the Polars engine resolves phase identifiers without this cache
+    if args.engine == "pandas":
+        cache = phase_identifier_cache_info()
+        hits = cache.hits - phase_before.hits
+        lookups = hits + cache.misses - phase_before.misses
+        print(
+            f"Phase identifier cache : {hits} hits / {lookups} lookups "
+            f"({hits / lookups if lookups else 0:.1%})"
+        )
+
+        report.info.update(phase_cache_hits=hits, phase_cache_lookups=lookups)
+    if args.parse_cache:
+        hits = parse_cache_stats["hits"] - parse_before["hits"]
+        lookups = hits + parse_cache_stats["misses"] - parse_before["misses"]
+        print(
+            f"Parse cache : {hits} hits / {lookups} lookups "
+            f"({hits / lookups if lookups else 0:.1%})"
+        )
+        report.info.update(parse_cache_hits=hits, parse_cache_lookups=lookups)
+    report_path = os.path.splitext(to_save)[0] + ".run.json"
+    report.save(report_path)
+    print("Stage timings :")
+    report.print_summary()
+    print(f"Run report : {report_path}")
+    return to_save
+
+
+# ----------------------------
+# Watch-folder service
+# ----------------------------
+PANEL_EXTENSIONS = (".xlsx", ".csv", ".parquet")
+WATCH_STATE_FILE = ".processed.json"
+# Files the job writes itself, never taken as panel exports
+OUTPUT_FILE = re.compile(
+    r"^(?:Incremental_Data|Change_Log)_\d{4}-\d{2}-\d{2}(?:_\d+)?\."
+)
+# Longest wait (seconds) between retries of an export that keeps failing
+WATCH_RETRY_MAX = 600
+
+
+def pending_exports(folder, processed, exclude=()):
+    """
+    (name, path, signature) of panel exports not processed in their current
+    form. The job's own outputs and the paths in `exclude` (the reference
+    workbook and its report) are skipped, in case they share the folder.
+    """
+    exclude = {os.path.abspath(path) for path in exclude}
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        # "~$" are Excel lock files of workbooks still open
+        if name.startswith(("~$", ".")) or not name.lower().endswith(PANEL_EXTENSIONS):
+            continue
+        if OUTPUT_FILE.match(name) or os.path.abspath(path) in exclude:
+            continue
+        if not os.path.isfile(path):
+            continue
+        stat = os.stat(path)
+        signature = [stat.st_mtime, stat.st_size]
+        if processed.get(name) != signature:
+            yield name, path, signature
+
+
+def load_watch_state(path):
+    """Signatures of the exports already processed ({} if unreadable)."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            processed = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return processed if isinstance(processed, dict) else {}
+
+
+def save_watch_state(processed, path):
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(processed, f)
+
+    atomic_write(path, write)
+
+
+def watch_folder(args):
+    """
+    Poll args.watch for new or replaced panel exports and process each one with
+    the reference store (and its fingerprint index) kept open between files.
+    A file is only picked up once it looks the same on two polls in a row, so
+    exports still being copied in are left alone. An export that fails is
+    retried with a doubling delay until it succeeds or changes. Stops on Ctrl+C.
+    """
+    folder = args.watch
+    state_file = os.path.join(folder, WATCH_STATE_FILE)
+    processed = load_watch_state(state_file)
+
+    store = open_reference_store(
+        args.backend, args.reference, snapshot=not args.no_snapshot
+    )
+    store.fingerprints()  # warm the XID index before the first export lands
+    last_seen = {}
+    failures = {}  # name -> (signature, retry at, delay) of failed exports
+
+    print(f"Watching {folder} every {args.watch_interval}s (Ctrl+C to stop)")
+    try:
+        while True:
+            for name, path, signature in pending_exports(
+                folder, processed, exclude=(args.reference, args.export_path)
+            ):
+                if last_seen.get(name) != signature:
+                    last_seen[name] = signature
+                    continue
+                failed = failures.get(name)
+                if failed and failed[0] != signature:
+                    failed = None  # replaced since: a new export, try it now
+                if failed and time.time() < failed[1]:
+                    continue
+                print(f"\n📥 New panel export : {name}")
+                try:
+                    to_save = incremental_output_path(
+                        os.path.split(args.reference)[0], unique=True
+                    )
+                    run_export(args, path, store=store, to_save=to_save)
+                except Exception as error:
+                    # one bad export must not stop the service, and a transient
+                    # failure (API down, file locked) must not drop the export
+                    delay = args.watch_interval
+                    if failed:
+                        delay = min(failed[2] * 2, WATCH_RETRY_MAX)
+                    failures[name] = (signature, time.time() + delay, delay)
+                    print(
+                        f"Failed to process {name} : {error!r} "
+                        f"(retrying in {delay:g}s)"
+                    )
+                    continue
+                failures.pop(name, None)
+                processed[name] = signature
+                save_watch_state(processed, state_file)
+            time.sleep(args.watch_interval)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.workers == 0:
+        args.workers = os.cpu_count() or 1
+
+    if args.watch:
+        watch_folder(args)
+    else:
+        run_export(args, args.panel)
+
     print("Thanks for your patience")
     exit()
 
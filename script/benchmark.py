@@ -0,0 +1,568 @@
+import os
+import sys
+import argparse
+import json
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from app import (
+    COLUMNS_TO_FLATTEN,
+    ENGINES,
+    NUM_COLS,
+    URL_COLUMNS,
+    combine_links,
+    compare_dataframes,
+    expand_url_columns,
+    flatten_and_merge_columns,
+    load_engine,
+    process_data,
+    process_tables,
+    select_columns_from_tables,
+)
+from instrumentation import current_rss_mb, peak_rss_mb
+from output_writer import write_frame
+from reference_store import build_fingerprint_index
+
+
+def legacy_combine_links(selected_columns):
+    """The per-XID groupby.apply callback combine_links replaced (for comparison)."""
+
+    def combine(group):
+        links = group["Brochure Link"].dropna().unique().tolist()
+        combined_link = ", ".join(links) if links else np.nan
+        numeric_data = group[NUM_COLS].bfill().iloc[0]
+        return pd.Series(
+            [group["XID"].iloc[0], *numeric_data, combined_link],
+            index=["XID", *NUM_COLS, "Brochure Link"],
+        )
+
+    return selected_columns.groupby("XID", as_index=False).apply(combine)
+
+
+# ----------------------------
+# Synthetic data
+# ----------------------------
+CONSTRUCTION_STATUSES = ["Under Construction", "Ready To Move", "New Launch", "null"]
+POSSESSION_STATUSES = ["Ready to Move", "Under Construction", "null"]
+PROPERTY_TYPES = ["Apartment", "Villa", "Plot", "Independent Floor"]
+PRICE_CATEGORIES = ["Base Price", "All Inclusive", "Launch Price"]
+CDN = "https://imagecdn.99acres.com/media1"
+
+
+def _phase_identifier(rng, project, phase_no):
+    status = rng.choice(["UC_", "RTM_"])
+    rera = rng.choice(
+        [f"P5180000{rng.randint(1000, 9999)}", "null", f"RERA-GGM-{project}"]
+    )
+    return f"Phase {phase_no}_{rng.randint(1, 9)}_{status}{rera}"
+
+
+def _maybe(rng, value, p_null=0.3):
+    return "null" if rng.random() < p_null else value
+
+
+def _lines(*pairs):
+    return "\n".join(f"{key}: {val}" for key, val in pairs)
+
+
+def make_panel_row(rng, xid, visit_date, max_phases):
+    """One panel export row with the multiline `key: value` text columns."""
+    phases = [
+        _phase_identifier(rng, xid, i + 1) for i in range(rng.randint(1, max_phases))
+    ]
+
+    basic = _lines(
+        ("projectdetails_projectname", f"Project {xid}"),
+        ("projectdetails_buildername", f"Builder {xid % 97}"),
+        ("projectdetails_totalarea", _maybe(rng, round(rng.uniform(0.3, 40), 2))),
+        ("projectdetails_openarea", _maybe(rng, rng.choice([30, 40, 50, 60, 70]))),
+        ("projectdetails_floorcount", _maybe(rng, rng.randint(4, 40))),
+        ("projectdetails_towercount", _maybe(rng, rng.randint(1, 12))),
+        ("projectdetails_possessionstatus", rng.choice(POSSESSION_STATUSES)),
+        ("projectdetails_latitude", round(rng.uniform(12, 29), 6)),
+        ("projectdetails_longitude", round(rng.uniform(72, 88), 6)),
+        ("projectdetails_city", "Noida"),
+        ("projectdetails_uspdetails", "[]"),
+    )
+    phase_blocks = "\n".join(
+        _lines(
+            ("phaseIdentifier", phase),
+            ("ConstructionStatus", rng.choice(CONSTRUCTION_STATUSES)),
+            ("CompletionDate", f"20{rng.randint(25, 30)}-{rng.randint(1, 12):02d}-01"),
+            ("LaunchDate", _maybe(rng, f"20{rng.randint(18, 25)}-01-01")),
+            ("SaleableArea", _maybe(rng, rng.randint(500, 5000))),
+            ("Sources", "['Builder', 'RERA']"),
+        )
+        for phase in phases
+    )
+    brochure = "\n".join(
+        _lines(
+            ("phaseIdentifier", phase),
+            ("original", _maybe(rng, f"['{CDN}/{xid}/{i}/brochure.pdf']", 0.6)),
+            ("Source", "Builder"),
+        )
+        for i, phase in enumerate(phases)
+    )
+    payment_plan = "\n".join(
+        _lines(
+            ("phaseIdentifier", phase),
+            ("original", f"{CDN}/{xid}/{i}/payment.pdf?sig=abc"),
+            ("Source", "Builder"),
+            ("paymentPlanType", "CLP"),
+        )
+        for i, phase in enumerate(phases)
+    )
+    tower_details = "\n".join(
+        _lines(
+            ("phaseIdentifier", phase),
+            ("towerName", f"T{t + 1}"),
+            ("totalFloorNo", rng.randint(4, 40)),
+            ("propertyType", rng.choice(PROPERTY_TYPES)),
+            ("bhkConfig", "2,3"),
+            ("source", "Site Visit"),
+        )
+        for phase in phases
+        for t in range(rng.randint(1, 3))
+    )
+    certificates = "\n".join(
+        _lines(
+            ("phaseIdentifier", phase),
+            ("original", f"{CDN}/{xid}/{i}/oc.pdf?sig=abc"),
+            ("source", "Authority"),
+            ("towerId", rng.randint(1, 500)),
+        )
+        for i, phase in enumerate(phases)
+        if rng.random() < 0.3
+    )
+    options = "\n".join(
+        _lines(
+            ("superArea", rng.randint(500, 4000)),
+            ("bhk", rng.randint(1, 5)),
+            ("propertyType", rng.choice(PROPERTY_TYPES)),
+            ("areaUnit", "sqft"),
+            ("comments", ""),
+            ("isNew", rng.choice(["true", "false"])),
+        )
+        for _ in range(rng.randint(0, 4))
+    )
+    prices = "\n".join(
+        _lines(
+            ("phaseIdentifier", phase),
+            ("pricecategory", rng.choice(PRICE_CATEGORIES)),
+            ("source", "Builder"),
+            ("original", f"{CDN}/{xid}/{i}/price.pdf?sig=abc"),
+        )
+        for i, phase in enumerate(phases)
+    )
+
+    def urls(kind, count):
+        return "\n".join(f"original: {CDN}/{xid}/{kind}/{k}.jpg" for k in range(count))
+
+    return {
+        "XID": xid,
+        "rescom": rng.choice(["Residential", "RESIDENTIAL", "Commercial"]),
+        "Project Name": f"Project {xid}",
+        "City": "Noida",
+        "Locality": f"Sector {xid % 150}",
+        "visitdate": visit_date,
+        "Modify Date": visit_date + pd.Timedelta(hours=rng.randint(0, 23)),
+        "User": f"user{rng.randint(1, 40)}",
+        "Basic Details": basic,
+        "Phase & Construction Status": phase_blocks,
+        "Brochure": brochure,
+        "Payment Plan": payment_plan,
+        "Tower Details": tower_details,
+        "OC/CC Certificate": certificates or np.nan,
+        "Options Added": options or np.nan,
+        "Prices": prices,
+        "Project": urls("project", rng.randint(0, 12)) or np.nan,
+        "Locality.1": urls("locality", rng.randint(0, 3)) or np.nan,
+        "Raw Video": np.nan,
+        "Video URL": urls("video", rng.randint(0, 2)) or np.nan,
+        "Amenity (In Brochure)": np.nan,
+        "Amenities Added": "Gym, Pool",
+        "Options (In Brochure)": np.nan,
+        "Additional Details": np.nan,
+        "Additional Comments": np.nan,
+        "Info Not Available": np.nan,
+    }
+
+
+def make_panel(n_rows, max_phases=4, visits_per_xid=1.3, seed=0):
+    """
+    A synthetic "Field New Panel Data" export of `n_rows` rows (several visits for
+    some XIDs, 1..max_phases phases per project), as read by pd.read_excel.
+    """
+    rng = random.Random(seed)
+    n_xids = max(1, int(n_rows / visits_per_xid))
+    start = pd.Timestamp("2025-11-01")
+    rows = [
+        make_panel_row(
+            rng,
+            rng.randint(1, n_xids) + 100000,
+            start + pd.Timedelta(days=rng.randint(0, 30)),
+            max_phases,
+        )
+        for _ in range(n_rows)
+    ]
+    return pd.DataFrame(rows)
+
+
+def make_reference(cleaned_df, changed=0.1, seed=0):
+    """A reference DB that knows 80% of the XIDs, with `changed` of them edited."""
+    rng = np.random.default_rng(seed)
+    reference = cleaned_df.sample(frac=0.8, random_state=seed).reset_index(drop=True)
+    edited = rng.random(len(reference)) < changed
+    reference.loc[edited, "Tower Count"] = 999
+    return reference
+
+
+def make_selected_columns(n_rows, n_xids, seed=0):
+    """Flattened XID-level rows: several per XID, sparse numbers and links."""
+    rng = np.random.default_rng(seed)
+    xids = rng.integers(1, n_xids + 1, n_rows)
+    df = pd.DataFrame({"XID": [f"R{xid}" for xid in xids]})
+    for col in NUM_COLS:
+        values = rng.integers(1, 60, n_rows).astype(float)
+        values[rng.random(n_rows) < 0.7] = np.nan
+        df[col] = values
+    links = np.array(
+        [
+            f"https://imagecdn.99acres.com/media1/{xid}/{i % 3}.pdf"
+            for i, xid in enumerate(xids)
+        ],
+        dtype=object,
+    )
+    links[rng.random(n_rows) < 0.8] = np.nan
+    df["Brochure Link"] = links
+    return df
+
+
+# ----------------------------
+# Measurement
+# ----------------------------
+def timed(func, *args, repeat=3):
+    """Best wall time of `repeat` runs and the last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def peak_memory(func, *args):
+    """Peak Python allocation (bytes) while running func once."""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_stage(results, name, func, *args, memory=True, rows=None):
+    """Time one stage, optionally re-run it under tracemalloc, and record it."""
+    seconds, output = timed(func, *args, repeat=1)
+    record = {"stage": name, "seconds": round(seconds, 4)}
+    if rows is not None:
+        record["rows"] = rows
+    if memory:
+        record["peak_mb"] = round(peak_memory(func, *args) / 2**20, 1)
+    results.append(record)
+    print(
+        f"  {name:<22} {seconds:9.3f}s"
+        + (f"  peak {record['peak_mb']:9.1f} MB" if memory else "")
+    )
+    return output
+
+
+# ----------------------------
+# Suites
+# ----------------------------
+def bench_pipeline(n_rows, max_phases=4, workers=1, memory=True, seed=0):
+    """Time every pipeline stage on a synthetic export of n_rows rows."""
+    print(f"\npipeline  rows={n_rows:,}  max_phases={max_phases}  workers={workers}")
+    results = []
+    panel = run_stage(
+        results, "generate", make_panel, n_rows, max_phases, 1.3, seed, memory=False
+    )
+
+    df_xl = run_stage(
+        results,
+        "process_data",
+        lambda df: process_data(df.copy(), workers=workers),
+        panel,
+        memory=memory,
+        rows=len(panel),
+    )
+    df_flat = run_stage(
+        results,
+        "flatten_and_merge",
+        flatten_and_merge_columns,
+        df_xl,
+        COLUMNS_TO_FLATTEN,
+        memory=memory,
+        rows=len(df_xl),
+    )
+    run_stage(
+        results,
+        "expand_url_columns",
+        lambda df: expand_url_columns(df.copy(), URL_COLUMNS),
+        df_flat,
+        memory=memory,
+        rows=len(df_flat),
+    )
+    tables = run_stage(
+        results,
+        "process_tables",
+        lambda df: process_tables(df.copy(), workers=workers),
+        panel,
+        memory=memory,
+        rows=len(panel),
+    )
+    selected_columns = run_stage(
+        results,
+        "select_from_tables",
+        select_columns_from_tables,
+        tables,
+        memory=memory,
+        rows=len(panel),
+    )
+    cleaned_df = run_stage(
+        results,
+        "combine_links",
+        combine_links,
+        selected_columns,
+        memory=memory,
+        rows=len(selected_columns),
+    ).replace({np.nan: "NA"})
+
+    reference = make_reference(cleaned_df, seed=seed)
+    run_stage(
+        results,
+        "compare_dataframes",
+        compare_dataframes,
+        reference,
+        cleaned_df,
+        memory=memory,
+        rows=len(cleaned_df),
+    )
+    index = build_fingerprint_index(reference)
+    run_stage(
+        results,
+        "compare (fingerprints)",
+        lambda df: compare_dataframes(None, df, fingerprints=index),
+        cleaned_df,
+        memory=memory,
+        rows=len(cleaned_df),
+    )
+
+    for record in results:
+        record["n_rows"] = n_rows
+    return results
+
+
+def bench_combine_links(n_rows, n_xids, repeat):
+    selected_columns = make_selected_columns(n_rows, n_xids)
+    legacy_time, expected = timed(legacy_combine_links, selected_columns, repeat=repeat)
+    new_time, actual = timed(combine_links, selected_columns, repeat=repeat)
+
+    same = (
+        expected.replace({np.nan: "NA"})
+        .astype(str)
+        .equals(actual.replace({np.nan: "NA"}).astype(str))
+    )
+    print(
+        f"combine_links  rows={n_rows:>9,} xids={n_xids:>8,}  "
+        f"apply={legacy_time:8.3f}s  agg={new_time:8.3f}s  "
+        f"speedup={legacy_time / new_time:6.1f}x  identical={same}"
+    )
+
+
+def bench_engine(engine_name, panel_path, output_path, seed=0):
+    """
+    One engine end to end on a saved panel (see bench_engines): wall time and
+    RSS per stage, and the cleaned / compared frames written next to
+    output_path for checking against the other engine.
+    """
+    engine = load_engine(engine_name)
+    panel = pd.read_parquet(panel_path)
+    baseline = current_rss_mb()
+    results = []
+
+    def stage(name, func, *args):
+        start = time.perf_counter()
+        output = func(*args)
+        results.append(
+            {
+                "engine": engine_name,
+                "stage": name,
+                "seconds": round(time.perf_counter() - start, 4),
+                "rss_mb": round(current_rss_mb(), 1),
+            }
+        )
+        return output
+
+    tables = stage("process_tables", lambda: engine.process_tables(panel.copy()))
+    selected = stage("select_columns", engine.select_columns_from_tables, tables)
+    del tables
+    cleaned = stage("combine_links", engine.combine_links, selected)
+    cleaned = cleaned.replace({np.nan: "NA"})
+    reference = make_reference(cleaned, seed=seed)
+    changed = stage("compare", engine.compare_dataframes, reference, cleaned)
+    index = build_fingerprint_index(reference)
+    stage(
+        "compare (fingerprints)",
+        lambda: engine.compare_dataframes(None, cleaned, fingerprints=index),
+    )
+
+    cleaned.astype(str).to_parquet(output_path + ".cleaned.parquet")
+    changed.astype(str).to_parquet(output_path + ".changed.parquet")
+    summary = {
+        "engine": engine_name,
+        "rows": len(panel),
+        "seconds": round(sum(record["seconds"] for record in results), 4),
+        "baseline_rss_mb": round(baseline, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "stages": results,
+    }
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def bench_engines(n_rows, max_phases=4, seed=0):
+    """
+    pandas vs polars on the same synthetic export. Each engine runs in its own
+    process, so peak RSS (which tracemalloc cannot see for Polars' native
+    buffers) is measured separately and from the same starting point.
+    """
+    print(f"\nengines  rows={n_rows:,}  max_phases={max_phases}")
+    folder = tempfile.mkdtemp()
+    panel_path = os.path.join(folder, "panel.parquet")
+    make_panel(n_rows, max_phases, seed=seed).astype(str).replace(
+        "nan", None
+    ).to_parquet(panel_path)
+
+    summaries = []
+    for engine_name in ENGINES:
+        output_path = os.path.join(folder, f"{engine_name}.json")
+        subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--suite",
+                "engine",
+                "--engine",
+                engine_name,
+                "--panel-file",
+                panel_path,
+                "--json",
+                output_path,
+            ],
+            check=True,
+        )
+        with open(output_path, encoding="utf-8") as f:
+            summaries.append(json.load(f))
+
+    for summary in summaries:
+        print(
+            f"  {summary['engine']:<8} {summary['seconds']:9.3f}s  "
+            f"peak RSS {summary['peak_rss_mb']:9.1f} MB  "
+            f"(panel loaded {summary['baseline_rss_mb']:.1f} MB)"
+        )
+        for record in summary["stages"]:
+            print(
+                f"    {record['stage']:<22} {record['seconds']:9.3f}s  "
+                f"RSS {record['rss_mb']:9.1f} MB"
+            )
+    for suffix in (".cleaned.parquet", ".changed.parquet"):
+        frames = [
+            pd.read_parquet(os.path.join(folder, f"{name}.json{suffix}"))
+            for name in ENGINES
+        ]
+        same = all(frame.equals(frames[0]) for frame in frames[1:])
+        print(f"  {suffix[1:].split('.')[0]:<8} identical={same}")
+    return summaries
+
+
+def bench_write(n_rows, seed=0):
+    """pandas' to_excel against the streaming write_frame for one sheet."""
+    selected_columns = make_selected_columns(n_rows, n_rows, seed)
+    df = combine_links(selected_columns).replace({np.nan: "NA"})
+    folder = tempfile.mkdtemp()
+    print(f"\nwrite  rows={len(df):,}")
+    results = []
+    for name, func in (
+        ("to_excel", lambda path: df.to_excel(path, index=False)),
+        ("write_frame", lambda path: write_frame(df, path)),
+    ):
+        path = os.path.join(folder, f"{name}.xlsx")
+        seconds, _ = timed(func, path, repeat=1)
+        peak = peak_memory(func, path) / 2**20
+        results.append(
+            {"stage": name, "seconds": round(seconds, 4), "peak_mb": round(peak, 1)}
+        )
+        print(f"  {name:<22} {seconds:9.3f}s  peak {peak:9.1f} MB")
+    for record in results:
+        record["n_rows"] = len(df)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline stage benchmarks")
+    parser.add_argument(
+        "--suite",
+        choices=["pipeline", "combine_links", "engines", "engine", "write"],
+        default="pipeline",
+    )
+    parser.add_argument(
+        "--engine", choices=ENGINES, default="pandas", help="For --suite engine"
+    )
+    parser.add_argument(
+        "--panel-file", help="Panel parquet for --suite engine (see bench_engines)"
+    )
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--max-phases", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--no-memory", action="store_true", help="Skip the tracemalloc re-runs"
+    )
+    parser.add_argument("--json", help="Write the stage results to this file")
+    args = parser.parse_args(argv)
+
+    if args.suite == "combine_links":
+        for n_rows in args.rows:
+            bench_combine_links(n_rows, max(1, n_rows // 3), args.repeat)
+        return
+
+    if args.suite == "engine":
+        bench_engine(args.engine, args.panel_file, args.json)
+        return
+
+    results = []
+    for n_rows in args.rows:
+        if args.suite == "engines":
+            results += bench_engines(n_rows, args.max_phases)
+            continue
+        if args.suite == "write":
+            results += bench_write(n_rows)
+            continue
+        results += bench_pipeline(
+            n_rows, args.max_phases, args.workers, memory=not args.no_memory
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Local stand-in for field_details_api.php, for exercising sync_client without the
+real server:
+
+    python script/fake_field_api.py --port 8765 --seed incremental_data/Reference_DB_Data.xlsx
+    python script/app.py --sync --api-url http://127.0.0.1:8765/field_details_api.php
+
+GET ?key=all&value=all[&page=N&limit=M] returns {"data": [...], "total": n};
+POST with a JSON list of records upserts them on XID.
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+KEY = "XID"
+
+
+class FakeFieldApi(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, records=None, latency=0.0, fail_rate=0.0):
+        super().__init__(address, FieldApiHandler)
+        self.records = {str(r[KEY]): r for r in records or []}
+        self.lock = threading.Lock()
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.requests = {"GET": 0, "POST": 0, "failed": 0}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/field_details_api.php"
+
+    def start(self):
+        """Serve on a background thread (for scripts and benchmarks)."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class FieldApiHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _should_fail(self):
+        server = self.server
+        time.sleep(server.latency)
+        with server.lock:
+            server.requests[self.command] += 1
+            if random.random() < server.fail_rate:
+                server.requests["failed"] += 1
+                return True
+        return False
+
+    def do_GET(self):
+        if self._should_fail():
+            return self._send(503, {"error": "try again"})
+        query = parse_qs(urlparse(self.path).query)
+        with self.server.lock:
+            rows = list(self.server.records.values())
+        if "page" in query:
+            limit = int(query.get("limit", ["1000"])[0])
+            start = (int(query["page"][0]) - 1) * limit
+            return self._send(
+                200, {"data": rows[start : start + limit], "total": len(rows)}
+            )
+        self._send(200, rows)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        records = json.loads(self.rfile.read(length) or b"[]")
+        if self._should_fail():
+            return self._send(503, {"error": "try again"})
+        with self.server.lock:
+            for record in records:
+                self.server.records[str(record[KEY])] = record
+        self._send(200, {"status": "success", "count": len(records)})
+
+
+def load_seed(path):
+    if not path:
+        return []
+    df = pd.read_excel(path, keep_default_na=False)
+    df = df.drop_duplicates(subset=KEY, keep="last")
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fake field_details_api server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", default=None, help="Workbook to preload records from")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds per request"
+    )
+    parser.add_argument(
+        "--fail-rate", type=float, default=0.0, help="Share of requests answered 503"
+    )
+    args = parser.parse_args(argv)
+
+    server = FakeFieldApi(
+        (args.host, args.port),
+        records=load_seed(args.seed),
+        latency=args.latency,
+        fail_rate=args.fail_rate,
+    )
+    print(f"Serving {len(server.records)} records on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
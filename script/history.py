@@ -0,0 +1,349 @@
+"""
+Queryable history of the Incremental_Data_* outputs:
+
+    python script/history.py ingest --folder incremental_data
+    python script/history.py xid R12345 --column "Tower Count" --changes
+    python script/history.py range --since 2025-11-01 --until 2025-11-30
+
+Each incremental file is ingested once into an append-only store next to it
+(incremental_data/history/): one Parquet segment per file and an
+XID -> (date, segment, row) index, so a point lookup only reads the rows it
+needs and a date range only the segments inside it. Needs pyarrow.
+"""
+
+import os
+import re
+import json
+import argparse
+import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from output_writer import atomic_write, write_frame
+
+KEY = "XID"
+HISTORY_DIR = "history"
+SEGMENTS_DIR = "segments"
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "xid_index.arrow"
+INCREMENTAL_FILE = re.compile(
+    r"^Incremental_Data_(\d{4}-\d{2}-\d{2})(?:_(\d+))?\.(?:xlsx|csv|parquet)$"
+)
+# Copies of one output in several formats are ingested once, from the first
+# here: the workbook is always written and reads back numbers as Excel shows them
+FORMAT_PREFERENCE = [".xlsx", ".parquet", ".csv"]
+# Columns every segment starts with, ahead of the incremental file's own
+SEGMENT_KEYS = ["Date", "Source", "Row"]
+INDEX_SCHEMA = pa.schema(
+    [
+        (KEY, pa.string()),
+        ("Date", pa.date32()),
+        ("Segment", pa.int32()),
+        ("Row", pa.int32()),
+    ]
+)
+
+
+def history_path(folder):
+    return os.path.join(folder, HISTORY_DIR)
+
+
+def incremental_file_order(name):
+    """(date, run of the day) of an Incremental_Data_* file name, else None."""
+    match = INCREMENTAL_FILE.match(name)
+    if match is None:
+        return None
+    date = datetime.date.fromisoformat(match.group(1))
+    return date, int(match.group(2) or 1)
+
+
+def read_incremental(path):
+    """An incremental output as text ("NA" and numbers exactly as written)."""
+    if path.endswith(".csv"):
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    elif path.endswith(".parquet"):
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_excel(path, keep_default_na=False)
+    return (
+        df.astype(object)
+        .where(df.notna(), None)
+        .map(lambda value: None if value is None else str(value))
+    )
+
+
+def _date(value):
+    if value is None or isinstance(value, datetime.date):
+        return value
+    return datetime.date.fromisoformat(value)
+
+
+class HistoryStore:
+    """
+    Append-only store of ingested incremental files. Segments are never
+    rewritten; the index and the manifest are replaced atomically after a
+    segment is in place, so an interrupted ingest leaves the store as it was.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.segments_path = os.path.join(path, SEGMENTS_DIR)
+        self.manifest_path = os.path.join(path, MANIFEST_FILE)
+        self.index_path = os.path.join(path, INDEX_FILE)
+        os.makedirs(self.segments_path, exist_ok=True)
+        self.manifest = {"segments": []}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+
+    def segment_path(self, segment):
+        return os.path.join(self.segments_path, f"{segment:06d}.parquet")
+
+    def ingested(self):
+        """Ingested outputs by name without extension (one per run of the job)."""
+        return {
+            os.path.splitext(entry["file"])[0] for entry in self.manifest["segments"]
+        }
+
+    # --- Ingest ---
+    def ingest(self, file_path):
+        """Add one incremental file; returns its row count (None if already in)."""
+        name = os.path.basename(file_path)
+        order = incremental_file_order(name)
+        if order is None:
+            raise ValueError(f"Not an Incremental_Data_* file: {name}")
+        if os.path.splitext(name)[0] in self.ingested():
+            return None
+        date, run = order
+        segment = len(self.manifest["segments"]) + 1
+
+        df = read_incremental(file_path)
+        table = pa.Table.from_pandas(
+            df.assign(Date=date, Source=name, Row=range(len(df)))[
+                [*SEGMENT_KEYS, *df.columns]
+            ],
+            preserve_index=False,
+        ).cast(
+            pa.schema(
+                [
+                    ("Date", pa.date32()),
+                    ("Source", pa.string()),
+                    ("Row", pa.int32()),
+                    *((str(col), pa.string()) for col in df.columns),
+                ]
+            )
+        )
+        atomic_write(
+            self.segment_path(segment), lambda path: pq.write_table(table, path)
+        )
+
+        entries = pa.table(
+            {
+                KEY: table.column(KEY),
+                "Date": table.column("Date"),
+                "Segment": pa.array([segment] * len(df), pa.int32()),
+                "Row": table.column("Row"),
+            },
+            schema=INDEX_SCHEMA,
+        )
+        index = self.index()
+        # entries of a segment left behind by an interrupted ingest are replaced
+        index = index.filter(pc.less(index.column("Segment"), segment))
+        index = pa.concat_tables([index, entries]).sort_by(
+            [(KEY, "ascending"), ("Date", "ascending"), ("Segment", "ascending")]
+        )
+        atomic_write(self.index_path, lambda path: self._write_index(index, path))
+
+        self.manifest["segments"].append(
+            {
+                "segment": segment,
+                "file": name,
+                "date": date.isoformat(),
+                "run": run,
+                "rows": len(df),
+                "columns": [str(col) for col in df.columns],
+            }
+        )
+        atomic_write(self.manifest_path, self._write_manifest)
+        return len(df)
+
+    def ingest_folder(self, folder):
+        """Ingest every Incremental_Data_* file in `folder` not yet in the store."""
+        names = sorted(
+            (name for name in os.listdir(folder) if incremental_file_order(name)),
+            key=lambda name: (
+                incremental_file_order(name),
+                FORMAT_PREFERENCE.index(os.path.splitext(name)[1]),
+            ),
+        )
+        added = {}
+        for name in names:
+            # the first copy of each output taken is in the preferred format
+            if os.path.splitext(name)[0] not in self.ingested():
+                added[name] = self.ingest(os.path.join(folder, name))
+        return added
+
+    def _write_index(self, index, path):
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, INDEX_SCHEMA) as writer:
+                writer.write_table(index)
+
+    def _write_manifest(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+
+    # --- Queries ---
+    def index(self):
+        """The XID index (memory-mapped), sorted by XID, date and segment."""
+        if not os.path.exists(self.index_path):
+            return INDEX_SCHEMA.empty_table()
+        with pa.memory_map(self.index_path, "r") as source:
+            return pa.ipc.open_file(source).read_all()
+
+    def _segments_in(self, since=None, until=None):
+        since, until = _date(since), _date(until)
+        return [
+            entry["segment"]
+            for entry in self.manifest["segments"]
+            if (since is None or _date(entry["date"]) >= since)
+            and (until is None or _date(entry["date"]) <= until)
+        ]
+
+    def _read(self, segment, columns=None, rows=None):
+        names = None
+        if columns is not None:
+            available = pq.read_schema(self.segment_path(segment)).names
+            names = [col for col in SEGMENT_KEYS + [KEY, *columns] if col in available]
+        table = pq.read_table(self.segment_path(segment), columns=names)
+        if rows is not None:
+            table = table.take(pa.array(rows))
+        return table.to_pandas().assign(Segment=segment)
+
+    def _frame(self, parts, columns=None):
+        if not parts:
+            if columns is None:
+                columns = [
+                    col
+                    for entry in self.manifest["segments"]
+                    for col in entry["columns"]
+                ]
+            columns = [col for col in dict.fromkeys(columns) if col != KEY]
+            return pd.DataFrame(columns=[*SEGMENT_KEYS, KEY, *columns])
+        df = pd.concat(parts, ignore_index=True)
+        df = df.sort_values(["Date", "Segment", "Row"], kind="stable")
+        return df.drop(columns="Segment").reset_index(drop=True)
+
+    def lookup(self, xid, columns=None, since=None, until=None):
+        """Every ingested row of one XID, oldest first."""
+        index = self.index()
+        mask = pc.equal(index.column(KEY), str(xid))
+        if since is not None:
+            mask = pc.and_(mask, pc.greater_equal(index.column("Date"), _date(since)))
+        if until is not None:
+            mask = pc.and_(mask, pc.less_equal(index.column("Date"), _date(until)))
+        hits = index.filter(mask).to_pandas()
+        parts = [
+            self._read(segment, columns, rows["Row"].tolist())
+            for segment, rows in hits.groupby("Segment", sort=True)
+        ]
+        return self._frame(parts, columns)
+
+    def date_range(self, since=None, until=None, columns=None, xids=None):
+        """Every ingested row dated within [since, until], optionally for some XIDs."""
+        parts = []
+        for segment in self._segments_in(since, until):
+            part = self._read(segment, columns)
+            if xids is not None:
+                part = part.loc[part[KEY].isin([str(xid) for xid in xids])]
+            parts.append(part)
+        return self._frame(parts, columns)
+
+
+CHANGE_COLUMNS = [*SEGMENT_KEYS, KEY, "Column", "Value", "Previous"]
+
+
+def value_changes(history, column):
+    """
+    The rows of `history` (oldest first) where `column` took a new value for
+    its XID, including the first time each XID was seen (Previous is None).
+    """
+    if history.empty or column not in history.columns:
+        return pd.DataFrame(columns=CHANGE_COLUMNS)
+    previous = history.groupby(KEY, sort=False)[column].shift()
+    is_first = ~history[KEY].duplicated()
+    changed = is_first | (history[column] != previous)
+    changes = history.loc[changed, [*SEGMENT_KEYS, KEY]].assign(
+        Column=column,
+        Value=history.loc[changed, column],
+        Previous=previous[changed].where(~is_first[changed], None),
+    )
+    return changes.reset_index(drop=True)
+
+
+def _print_or_save(df, output):
+    if output is None:
+        print(df.to_string(index=False) if not df.empty else "No rows")
+    else:
+        write_frame(df, output)
+        print(f"{len(df)} rows written to {output}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental output history")
+    parser.add_argument(
+        "--folder",
+        default="incremental_data",
+        help="Folder holding the Incremental_Data_* files (the store is in history/)",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("ingest", help="Add incremental files not ingested yet")
+
+    xid = commands.add_parser("xid", help="History of one XID")
+    xid.add_argument("xid")
+    xid.add_argument("--column", action="append", help="Only these columns")
+    xid.add_argument(
+        "--changes",
+        action="store_true",
+        help="Only the dates a --column took a new value",
+    )
+
+    dates = commands.add_parser("range", help="Rows ingested for a date range")
+    dates.add_argument("--xid", action="append", help="Only these XIDs")
+    dates.add_argument("--column", action="append", help="Only these columns")
+
+    for command in (xid, dates):
+        command.add_argument("--since", default=None, help="YYYY-MM-DD (inclusive)")
+        command.add_argument("--until", default=None, help="YYYY-MM-DD (inclusive)")
+        command.add_argument(
+            "--output", default=None, help="Write a .xlsx, .csv or .parquet"
+        )
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(history_path(args.folder))
+    if args.command == "ingest":
+        added = store.ingest_folder(args.folder)
+        for name, rows in added.items():
+            print(f"Ingested {name} : {rows} rows")
+        print(f"{len(added)} new files, {len(store.ingested())} in the history")
+        return
+
+    if args.command == "xid":
+        history = store.lookup(args.xid, args.column, args.since, args.until)
+        if args.changes:
+            if not args.column:
+                parser.error("--changes needs --column")
+            history = pd.concat(
+                [value_changes(history, column) for column in args.column],
+                ignore_index=True,
+            ).sort_values(["Date", "Source", "Row"], kind="stable")
+    else:
+        history = store.date_range(args.since, args.until, args.column, args.xid)
+    _print_or_save(history, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import os
+import sys
+import json
+import time
+import datetime
+import cProfile
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:  # optional: fall back to the resource module / no RSS
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (None if it cannot be read)."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2**20
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None if unavailable)."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is bytes on macOS, kilobytes elsewhere
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 2**20
+    return None
+
+
+def _round(value, digits=1):
+    return None if value is None else round(value, digits)
+
+
+class RunReport:
+    """
+    Collects per-stage wall time, row counts and memory for one run of main().
+    Entering the same stage again (e.g. once per batch) adds to its totals, and
+    with a profile_dir each stage's cumulative cProfile stats go to <stage>.prof.
+    """
+
+    def __init__(self, trace_memory=False, profile_dir=None):
+        self.trace_memory = trace_memory
+        self.profile_dir = profile_dir
+        self.started = datetime.datetime.now()
+        self._start = time.perf_counter()
+        self.stages = {}
+        self.info = {}
+        self._profilers = {}
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+        if trace_memory:
+            tracemalloc.start()
+
+    def _record(self, name):
+        if name not in self.stages:
+            self.stages[name] = {"stage": name, "calls": 0, "seconds": 0.0}
+        return self.stages[name]
+
+    def add_rows(self, name, rows):
+        record = self._record(name)
+        record["rows"] = record.get("rows", 0) + rows
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        """Time the enclosed block as `name`; rows may also be added inside it."""
+        record = self._record(name)
+        profiler = None
+        if self.profile_dir:
+            profiler = self._profilers.setdefault(name, cProfile.Profile())
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+            record["calls"] += 1
+            record["seconds"] = round(
+                record["seconds"] + time.perf_counter() - start, 4
+            )
+            if rows is not None:
+                self.add_rows(name, rows)
+            record["rss_mb"] = _round(current_rss_mb())
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] / 2**20
+                record["traced_peak_mb"] = round(
+                    max(record.get("traced_peak_mb", 0), peak), 1
+                )
+
+    def timed_iter(self, name, iterable):
+        """Yield from `iterable`, timing each step as stage `name` and counting rows."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as record:
+                item = next(iterator, None)
+                if item is not None:
+                    record["rows"] = record.get("rows", 0) + len(item)
+            if item is None:
+                return
+            yield item
+
+    def summary(self):
+        return {
+            "started": self.started.strftime("%Y-%m-%d %H:%M:%S"),
+            "total_seconds": round(time.perf_counter() - self._start, 4),
+            "peak_rss_mb": _round(peak_rss_mb()),
+            **self.info,
+            "stages": list(self.stages.values()),
+        }
+
+    def save(self, path):
+        if self.trace_memory:
+            tracemalloc.stop()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2, default=str)
+
+    def print_summary(self):
+        for record in self.stages.values():
+            rows = record.get("rows")
+            print(
+                f"  {record['stage']:<18} {record['seconds']:9.3f}s"
+                + (f"  {rows:>10,} rows" if rows is not None else "")
+            )
@@ -0,0 +1,150 @@
+"""
+Streaming writers for the workbooks (and CSV / Parquet copies) the job produces.
+
+Rows are converted and written a chunk at a time, into openpyxl's write-only
+workbook for .xlsx, so memory stays flat however long the sheet gets. Every
+file is written next to its destination under a temporary name and moved
+into place with os.replace (atomic_write, also used for the job's JSON and
+Arrow side files), so a crash mid-write leaves the old file intact.
+"""
+
+import os
+
+import numpy as np
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+
+OUTPUT_FORMATS = ["xlsx", "csv", "parquet"]
+CHUNK_ROWS = 10_000
+
+# The header style pandas' to_excel gives its first row
+_THIN = Side(style="thin")
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+
+
+def atomic_write(path, write):
+    """
+    Call write(tmp_path) for a temporary file next to `path` and move it over
+    `path` in one step. If write fails, the temporary file is removed and
+    `path` is left as it was.
+    """
+    folder, name = os.path.split(path)
+    tmp_path = os.path.join(folder, f".{name}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+
+def output_format(path):
+    return os.path.splitext(path)[1].lstrip(".").lower()
+
+
+def with_format(path, fmt):
+    """`path` with its extension swapped for `fmt` (e.g. a .csv copy of an .xlsx)."""
+    return f"{os.path.splitext(path)[0]}.{fmt}"
+
+
+def iter_chunks(df, chunk_rows=CHUNK_ROWS):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start : start + chunk_rows]
+
+
+def _excel_values(series):
+    """One column as the cell values to_excel writes (NA as empty, inf as text)."""
+    values = series.to_numpy(dtype=object, copy=True)
+    values[series.isna().to_numpy()] = None
+    if series.dtype.kind == "f":
+        infinite = np.isinf(series.to_numpy())
+        values[infinite] = np.where(series.to_numpy()[infinite] > 0, "inf", "-inf")
+    return values
+
+
+def _header_row(sheet, columns):
+    cells = []
+    for name in columns:
+        cell = WriteOnlyCell(sheet, value=str(name))
+        cell.font = HEADER_FONT
+        cell.border = HEADER_BORDER
+        cell.alignment = HEADER_ALIGNMENT
+        cells.append(cell)
+    return cells
+
+
+def _write_xlsx(df, path, chunk_rows, sheet_name):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(_header_row(sheet, df.columns))
+    for chunk in iter_chunks(df, chunk_rows):
+        columns = [_excel_values(chunk.iloc[:, i]) for i in range(chunk.shape[1])]
+        for row in zip(*columns):
+            sheet.append(row)
+    workbook.save(path)
+
+
+def _write_csv(df, path, chunk_rows):
+    df.to_csv(path, index=False, chunksize=chunk_rows)
+
+
+def _parquet_frame(chunk):
+    """Object columns (numbers mixed with "NA" and the like) are stored as text."""
+    return chunk.apply(
+        lambda series: (
+            series.where(series.isna(), series.astype(str))
+            if series.dtype == object
+            else series
+        )
+    )
+
+
+def _write_parquet(df, path, chunk_rows):
+    import pyarrow as pa  # optional: only needed for Parquet output
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(
+        _parquet_frame(df.head(0)).astype(
+            {col: "string" for col in df.columns if df[col].dtype == object}
+        ),
+        preserve_index=False,
+    )
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in iter_chunks(df, chunk_rows):
+            writer.write_table(
+                pa.Table.from_pandas(
+                    _parquet_frame(chunk), schema=schema, preserve_index=False
+                )
+            )
+
+
+def write_frame(df, path, chunk_rows=CHUNK_ROWS, sheet_name="Sheet1"):
+    """
+    Write `df` (without its index) to `path` as .xlsx, .csv or .parquet by its
+    extension, atomically: the file only appears once it is complete.
+    """
+    fmt = output_format(path)
+    if fmt == "xlsx":
+        return atomic_write(
+            path, lambda tmp_path: _write_xlsx(df, tmp_path, chunk_rows, sheet_name)
+        )
+    if fmt == "csv":
+        return atomic_write(path, lambda tmp_path: _write_csv(df, tmp_path, chunk_rows))
+    if fmt == "parquet":
+        return atomic_write(
+            path, lambda tmp_path: _write_parquet(df, tmp_path, chunk_rows)
+        )
+    raise ValueError(f"Unknown output format: {path}")
+
+
+def write_outputs(df, path, extra_formats=()):
+    """Write `df` to `path` plus a copy in each of `extra_formats` beside it."""
+    paths = [write_frame(df, path)]
+    for fmt in extra_formats:
+        if fmt != output_format(path):
+            paths.append(write_frame(df, with_format(path, fmt)))
+    return paths
@@ -0,0 +1,98 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+MAX_ENTRIES = 500_000
+# Evict down to this share of MAX_ENTRIES so eviction does not run on every put
+EVICT_TO = 0.9
+# Keys per SQL statement (stays under SQLite's bound-parameter limit)
+CHUNK = 500
+
+# Lookups across the process and any parse workers (see process_tables)
+parse_cache_stats = {"hits": 0, "misses": 0}
+
+
+def parse_cache_path(reference_path):
+    return os.path.splitext(reference_path)[0] + ".parse_cache.sqlite"
+
+
+def cache_key(section, version, text):
+    raw = f"{section}\x1f{version}\x1f{text}".encode("utf-8", "surrogatepass")
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+class ParseCache:
+    """
+    Parsed section cells stored on disk across runs, keyed by a hash of
+    (section, parser version, raw text). Bumping the version orphans all old
+    entries, which are then evicted least-recently-used first once the cache
+    holds more than `max_entries` results.
+    """
+
+    def __init__(self, path, version, max_entries=MAX_ENTRIES):
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS parse_cache "
+            "(key TEXT PRIMARY KEY, value TEXT, last_used REAL)"
+        )
+
+    def get_many(self, section, texts):
+        """text -> cached parse result, for the texts that are in the cache."""
+        keys = {cache_key(section, self.version, text): text for text in texts}
+        found = {}
+        key_list = list(keys)
+        for start in range(0, len(key_list), CHUNK):
+            chunk = key_list[start : start + CHUNK]
+            marks = ", ".join("?" for _ in chunk)
+            rows = self.conn.execute(
+                f"SELECT key, value FROM parse_cache WHERE key IN ({marks})", chunk
+            ).fetchall()
+            # one json.loads for the whole chunk is much cheaper than one per row
+            values = json.loads("[" + ",".join(value for _, value in rows) + "]")
+            for (key, _), value in zip(rows, values):
+                found[keys[key]] = value
+            if rows:
+                with self.conn:
+                    self.conn.execute(
+                        f"UPDATE parse_cache SET last_used = ? WHERE key IN ({marks})",
+                        [time.time(), *chunk],
+                    )
+        parse_cache_stats["hits"] += len(found)
+        parse_cache_stats["misses"] += len(keys) - len(found)
+        return found
+
+    def put_many(self, section, results):
+        """Store {text: parse result}."""
+        now = time.time()
+        rows = [
+            (cache_key(section, self.version, text), json.dumps(result), now)
+            for text, result in results.items()
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO parse_cache VALUES (?, ?, ?)", rows
+            )
+
+    def evict(self):
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM parse_cache").fetchone()
+        if count <= self.max_entries:
+            return 0
+        excess = count - int(self.max_entries * EVICT_TO)
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM parse_cache WHERE key IN "
+                "(SELECT key FROM parse_cache ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+        return excess
+
+    def close(self):
+        """Evict past max_entries (once per run, not per put) and close."""
+        self.evict()
+        self.conn.close()
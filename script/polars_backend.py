@@ -0,0 +1,428 @@
+"""
+Polars execution of the panel pipeline (app.py --engine polars).
+
+Same steps and output as the pandas path, but each section column is parsed
+with vectorized string expressions instead of one parse_section call per cell:
+cells are split into blocks, lines and key / value pairs, exploded into a long
+token table and pivoted back into one row per item, all on Polars' thread pool.
+Selecting, grouping per XID and diffing against the reference are Polars
+group-bys and hash joins. Needs the optional polars package (pip install polars).
+"""
+
+import re
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from app import (
+    CHILD_KEYS,
+    CHILD_TABLES,
+    COLUMN_SCHEMA,
+    FLAG_VALUES,
+    FLATTENED_TABLES,
+    MAX_CATEGORY_RATIO,
+    NULL_VALUES,
+    NUM_COLS,
+    PHASE_NAME_PATTERN,
+    RERA_NUMBER_PATTERN,
+    SELECTED_COLUMNS,
+    _prepare_rows,
+    section_columns,
+    section_table,
+)
+from reference_store import (
+    KEY,
+    can_use_fingerprints,
+    canonical_values,
+    row_fingerprints,
+)
+
+# Everything str.strip() removes and str.splitlines() breaks on, so the
+# expressions below cut cells exactly where tokenize_blocks does
+PY_WHITESPACE = "".join(chr(c) for c in range(0x3001) if chr(c).isspace())
+LINE_BREAKS = "\r\n|[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]"
+# Marks block starts before splitting (Polars regexes have no lookahead)
+BLOCK_MARK = "\x00"
+
+# Vectorized versions of the spec "clean" functions, by function name
+CLEANERS = {
+    "strip_brackets": lambda val: val.str.replace_all(r"[\[\]']", ""),
+    "strip_query": lambda val: val.str.split("?").list.first(),
+}
+
+
+def block_marker(block_split):
+    """The literal text a PHASE_BLOCK_SPLIT-style lookahead regex splits before."""
+    match = re.fullmatch(r"\(\?=(.+)\)", block_split.pattern)
+    if match is None or re.escape(match.group(1)) != match.group(1):
+        raise ValueError(f"Unsupported block split for polars: {block_split.pattern}")
+    return match.group(1)
+
+
+# ----------------------------
+# Section parsing
+# ----------------------------
+def section_tokens(cells, spec):
+    """
+    Long (Row, block, column, val) table of one text column: what parse_section
+    feeds into its block dicts, in the same order.
+    """
+    text = pl.col("text")
+    if spec.get("split") is not None:
+        marker = block_marker(spec["split"])
+        text = text.str.strip_chars(PY_WHITESPACE).str.replace_all(
+            marker, BLOCK_MARK + marker, literal=True
+        )
+    lines = pl.col("block_text").str.replace_all(LINE_BREAKS, "\n").str.split("\n")
+    parts = pl.col("line").str.splitn(":", 2)
+
+    tokens = (
+        cells.lazy()
+        .select("Row", text.str.split(BLOCK_MARK).alias("block_text"))
+        .with_columns(block=pl.int_ranges(pl.col("block_text").list.len()))
+        .explode(["block_text", "block"])
+        .select("Row", "block", lines.alias("line"))
+        .explode("line")
+        .select(
+            "Row",
+            "block",
+            parts.struct.field("field_0").str.strip_chars(PY_WHITESPACE).alias("key"),
+            parts.struct.field("field_1").str.strip_chars(PY_WHITESPACE).alias("val"),
+        )
+        .filter(pl.col("val").is_not_null())
+    )
+
+    clean = spec.get("clean")
+    if clean is not None:
+        tokens = tokens.with_columns(val=CLEANERS[clean.__name__](pl.col("val")))
+    skip = spec.get("skip", NULL_VALUES)
+    tokens = tokens.filter(~pl.col("val").is_in(list(skip))).with_columns(
+        column=pl.col("key").replace_strict(
+            spec["mapping"], default=None, return_dtype=pl.String
+        )
+    )
+    if spec.get("strict", False):
+        unknown = tokens.filter(pl.col("column").is_null()).head(1).collect()
+        if unknown.height:
+            raise KeyError(unknown["key"][0])
+    return tokens.filter(pl.col("column").is_not_null()).select(
+        "Row", "block", "column", "val"
+    )
+
+
+def resolve_phases(items, phase):
+    """Vectorized _finish_block: split "Phase Identifier" as parse_phase_identifier does."""
+    if phase is None:
+        return items
+    if "Phase Identifier" not in items.columns:
+        # no block has a phase: "group" drops them all, the others keep them
+        return items.head(0) if phase == "group" else items
+    identifier = pl.col("Phase Identifier")
+    name = (
+        identifier.str.extract(PHASE_NAME_PATTERN.pattern, 1)
+        .str.strip_chars(PY_WHITESPACE)
+        .fill_null("")
+    )
+    if phase == "merge":
+        rera = identifier.str.extract(RERA_NUMBER_PATTERN.pattern, 1)
+        has_rera = rera.is_not_null() & (rera.str.to_lowercase() != "null")
+        return items.with_columns(
+            pl.when(identifier.is_not_null()).then(name).alias("Phase Identifier"),
+            pl.when(has_rera).then(rera).alias("RERA Number"),
+        )
+    if phase == "name":
+        return items.with_columns(
+            pl.when(identifier.is_not_null()).then(name).alias("Phase Identifier")
+        )
+    # group: blocks without a phase are dropped, the rest ordered by phase name
+    # (first appearance within the cell) and then by block
+    return (
+        items.filter(identifier.is_not_null())
+        .with_columns(name.alias("Phase Identifier"))
+        .with_columns(first=pl.col("block").min().over("Row", "Phase Identifier"))
+        .sort("Row", "first", "block", maintain_order=True)
+        .drop("first")
+    )
+
+
+def section_table_pl(cells, spec):
+    """
+    Polars twin of section_table for a (Row, ID, XID, text) frame. Specs that
+    share one dict across blocks (reset False) go through the Python parser.
+    """
+    columns = section_columns(spec)
+    if not spec.get("reset", True):
+        # indexed by panel row, which section_table reports as Row
+        index = cells["Row"].to_numpy()
+        table = section_table(
+            pd.Series(cells["text"].to_numpy(), index=index),
+            spec,
+            pd.Series(cells["ID"].to_numpy(), index=index),
+            pd.Series(cells["XID"].to_numpy(), index=index),
+        )
+        return pl.from_pandas(table).with_columns(
+            pl.col("Row").cast(pl.Int64),
+            pl.col("Item").cast(pl.Int32),
+            *(pl.col(col).cast(pl.String) for col in columns),
+        )
+
+    tokens = (
+        section_tokens(cells, spec)
+        # later duplicates of a key within a block win, as in parse_section
+        .unique(["Row", "block", "column"], keep="last", maintain_order=True).collect()
+    )
+    if tokens.height:
+        items = tokens.pivot(on="column", index=["Row", "block"], values="val")
+    else:
+        items = pl.DataFrame(schema={"Row": pl.Int64, "block": pl.Int64})
+    if spec.get("phase") != "group":
+        items = items.sort("Row", "block", maintain_order=True)
+    items = resolve_phases(items, spec.get("phase"))
+
+    keys = cells.select("Row", "ID", "XID")
+    return (
+        items.join(keys, on="Row", how="left", maintain_order="left")
+        .with_columns(Item=pl.int_range(pl.len(), dtype=pl.Int32).over("Row"))
+        .select(
+            *CHILD_KEYS,
+            *(
+                (
+                    pl.col(col)
+                    if col in items.columns
+                    else pl.lit(None, pl.String).alias(col)
+                )
+                for col in columns
+            ),
+        )
+    )
+
+
+def _text_cells(df, column):
+    """(Row, ID, XID, text) of one section column, text as str() gives it."""
+    return pl.DataFrame(
+        {
+            "Row": df.index.to_numpy(dtype=np.int64),
+            "ID": df["ID"].astype(str).to_numpy(),
+            "XID": df["XID"].astype(str).to_numpy(),
+            "text": df[column].astype(str).to_numpy(),
+        }
+    )
+
+
+def _rows_frame(rows):
+    """Panel rows as Polars (mixed-type text columns become strings)."""
+    mixed = {col: "string" for col in rows.columns if rows[col].dtype == object}
+    return pl.from_pandas(rows.astype(mixed))
+
+
+def process_tables(
+    df, workers=1, schema=COLUMN_SCHEMA, cache_path=None, cache_size=None
+):
+    """
+    app.process_tables with Polars frames: "rows" plus one table per
+    CHILD_TABLES entry, typed by `schema` unless it is None. `workers` and the
+    parse cache are not used: the expressions already run on Polars' thread
+    pool and parse every cell in one vectorized pass.
+    """
+    _prepare_rows(df)
+    tables = {
+        name: section_table_pl(_text_cells(df, column), spec)
+        for name, (column, spec) in CHILD_TABLES.items()
+    }
+    sections = [column for column, _ in CHILD_TABLES.values()]
+    rows = df.drop(columns=sections).rename_axis("Row").reset_index()
+    tables = {"rows": _rows_frame(rows), **tables}
+    return type_tables(tables, schema) if schema else tables
+
+
+def concat_tables(parts):
+    return {
+        name: pl.concat([part[name] for part in parts], how="diagonal_relaxed")
+        for name in parts[0]
+    }
+
+
+# ----------------------------
+# Column typing
+# ----------------------------
+def to_number(expr):
+    # NaN parsed from "nan" text is missing, as with pd.to_numeric
+    return expr.cast(pl.Float64, strict=False).fill_nan(None)
+
+
+def apply_schema(df, schema=COLUMN_SCHEMA):
+    """app.apply_schema for a Polars frame."""
+    typed = []
+    for col in df.columns:
+        kind = schema.get(col)
+        if kind is None or df[col].dtype != pl.String:
+            continue
+        expr = pl.col(col)
+        if kind == "number":
+            typed.append(to_number(expr))
+        elif kind == "date":
+            try:
+                typed.append(df[col].str.to_datetime(strict=False))
+            except pl.exceptions.ComputeError:
+                pass  # no single format fits: the column stays text
+        elif kind == "flag":
+            lowered = expr.str.strip_chars().str.to_lowercase()
+            typed.append(
+                lowered.replace_strict(
+                    FLAG_VALUES, default=None, return_dtype=pl.Boolean
+                )
+            )
+        elif kind == "category":
+            if df[col].n_unique() <= MAX_CATEGORY_RATIO * df.height:
+                typed.append(expr.cast(pl.Categorical))
+    return df.with_columns(typed)
+
+
+def frame_memory_mb(frames):
+    if isinstance(frames, dict):
+        return sum(frame_memory_mb(frame) for frame in frames.values())
+    return frames.estimated_size() / 2**20
+
+
+def type_tables(tables, schema=COLUMN_SCHEMA):
+    return {name: apply_schema(table, schema) for name, table in tables.items()}
+
+
+# ----------------------------
+# Select / combine
+# ----------------------------
+def select_columns_from_tables(tables):
+    """app.select_columns_from_tables for Polars tables (same rows, same order)."""
+    fields = SELECTED_COLUMNS[1:]
+    parts = [
+        tables["rows"].select(
+            pl.col("Row").cast(pl.Int64),
+            pl.col("XID").cast(pl.String),
+            Section=pl.lit(-1),
+            Item=pl.lit(-1, pl.Int32),
+        )
+    ]
+    for section, name in enumerate(FLATTENED_TABLES):
+        table = tables[name]
+        present = [col for col in fields if col in table.columns]
+        if not present or table.is_empty():
+            continue
+        values = [
+            to_number(pl.col(col)) if col in NUM_COLS else pl.col(col).cast(pl.String)
+            for col in present
+        ]
+        parts.append(
+            table.select(
+                pl.col("Row").cast(pl.Int64),
+                pl.col("XID").cast(pl.String),
+                pl.col("Item").cast(pl.Int32),
+                *values,
+                Section=pl.lit(section),
+            ).filter(pl.any_horizontal(pl.col(present).is_not_null()))
+        )
+
+    selected = pl.concat(parts, how="diagonal_relaxed")
+    selected = selected.sort("Row", "Section", "Item", maintain_order=True)
+    return selected.select(
+        pl.col("XID"),
+        *(
+            (
+                to_number(pl.col(col))
+                if col in selected.columns
+                else pl.lit(None, pl.Float64)
+            )
+            for col in NUM_COLS
+        ),
+        (
+            pl.col("Brochure Link").cast(pl.String)
+            if "Brochure Link" in selected.columns
+            else pl.lit(None, pl.String).alias("Brochure Link")
+        ),
+    )
+
+
+def concat_selected(parts):
+    if not parts:
+        schema = {"XID": pl.String, **{col: pl.Float64 for col in NUM_COLS}}
+        return pl.DataFrame(schema={**schema, "Brochure Link": pl.String})
+    return pl.concat(parts)
+
+
+def combine_links(selected_columns):
+    """
+    app.combine_links as one group-by, returned as the pandas frame the rest
+    of the run (export, compare, sync) works with.
+    """
+    links = pl.col("Brochure Link").drop_nulls().unique(maintain_order=True)
+    combined = (
+        selected_columns.group_by("XID")
+        .agg(
+            *(pl.col(col).drop_nulls().first() for col in NUM_COLS),
+            pl.when(links.len() > 0).then(links.str.join(", ")).alias("Brochure Link"),
+        )
+        .sort("XID")
+        .to_pandas()
+    )
+    combined["XID"] = combined["XID"].astype(object)
+    link = combined["Brochure Link"].astype(object)
+    combined["Brochure Link"] = link.where(link.notna(), np.nan)
+    return combined
+
+
+# ----------------------------
+# Compare
+# ----------------------------
+def _keyed(df, key, columns):
+    return pl.DataFrame(
+        {
+            key: df[key].astype(str).to_numpy(),
+            **{col: canonical_values(df[col]).to_numpy() for col in columns},
+        }
+    )
+
+
+def compare_dataframes(df_db, df_xl, fingerprints=None, key=KEY):
+    """
+    app.compare_dataframes with the XID lookup done as a Polars hash join of the
+    export against the stored fingerprints (or the canonical reference values).
+    """
+    df_xl = df_xl.drop_duplicates(subset=key, keep="first")
+
+    if can_use_fingerprints(fingerprints, df_xl):
+        stored = fingerprints["fingerprints"]
+        current = pl.DataFrame(
+            {
+                key: df_xl[key].astype(str).to_numpy(),
+                "current": row_fingerprints(df_xl, fingerprints["columns"]).to_numpy(),
+            }
+        )
+        reference = pl.DataFrame(
+            {key: list(stored), "stored": list(stored.values())},
+            schema={key: pl.String, "stored": pl.String},
+        )
+        joined = current.join(reference, on=key, how="left", maintain_order="left")
+        is_new = joined["stored"].is_null()
+        changed = ~is_new & (joined["stored"] != joined["current"])
+    else:
+        if df_db is None:
+            raise ValueError("df_db is required without a usable fingerprint index")
+        if df_db.empty:
+            return df_xl.reset_index(drop=True)
+        common_cols = sorted(set(df_db.columns) & set(df_xl.columns) - {key})
+        db_first = df_db.drop_duplicates(subset=key, keep="first")
+        reference = _keyed(db_first, key, common_cols).with_columns(_in_db=pl.lit(True))
+        joined = _keyed(df_xl, key, common_cols).join(
+            reference, on=key, how="left", suffix="_db", maintain_order="left"
+        )
+        is_new = joined["_in_db"].is_null()
+        differs = [pl.col(col) != pl.col(f"{col}_db") for col in common_cols]
+        changed = ~is_new & (
+            joined.select(pl.any_horizontal(differs)).to_series()
+            if differs
+            else pl.repeat(False, joined.height, eager=True)
+        )
+
+    is_new = is_new.to_numpy()
+    changed = changed.fill_null(False).to_numpy()
+    return pd.concat([df_xl.loc[is_new], df_xl.loc[changed]], ignore_index=True)
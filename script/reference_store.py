@@ -0,0 +1,543 @@
+import os
+import json
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from output_writer import atomic_write, write_frame
+
+try:
+    import pyarrow as pa
+except ImportError:  # optional: without it the workbook is always read
+    pa = None
+
+KEY = "XID"
+NA_TOKENS = ["N/A", "NA", ""]
+# 2: indexes hashing fewer columns than the reference DB are no longer kept
+FINGERPRINT_VERSION = 2
+FINGERPRINT_COL = "Fingerprint"
+EXPORT_FILE = "Reference_DB_Export.xlsx"
+
+# numpy integers are not bound by sqlite3 out of the box
+sqlite3.register_adapter(np.int64, int)
+sqlite3.register_adapter(np.int32, int)
+
+
+# ----------------------------
+# Row fingerprints
+# ----------------------------
+def normalize_na(series):
+    """Vectorized safe_eval: return an object array with NA-like values as None."""
+    values = series.to_numpy(dtype=object, copy=True)
+    is_na = series.isna().to_numpy() | (
+        series.astype(str).str.strip().str.upper().isin(NA_TOKENS).to_numpy()
+    )
+    values[is_na] = None
+    return values
+
+
+def _canonical(value):
+    """Stable text form of a safe_eval-normalized value (30 and 30.0 hash alike)."""
+    if value is None:
+        return "na"
+    if isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(
+        value, (bool, np.bool_)
+    ):
+        value = float(value)
+        return f"n:{int(value)}" if value.is_integer() else f"n:{value!r}"
+    return f"s:{value}"
+
+
+def canonical_values(series):
+    """NA-normalized values of `series` as comparable text ("na", "n:30", "s:abc")."""
+    return pd.Series(normalize_na(series), index=series.index).map(_canonical)
+
+
+def row_fingerprints(df, columns):
+    """Hash the NA-normalized values of `columns` into one hex string per row."""
+    parts = [canonical_values(df[col]) for col in columns]
+    joined = (
+        parts[0].str.cat(parts[1:], sep="\x1f")
+        if parts
+        else pd.Series("", index=df.index)
+    )
+    hashed = pd.util.hash_pandas_object(joined, index=False)
+    return hashed.map("{:016x}".format)
+
+
+def fingerprint_columns(columns, key=KEY):
+    return sorted(col for col in columns if col not in (key, FINGERPRINT_COL))
+
+
+def can_use_fingerprints(index, df):
+    """
+    The stored hashes are only comparable if they cover some columns (an index
+    of an empty reference DB hashes none) and `df` has every hashed column.
+    """
+    return (
+        index is not None
+        and bool(index["columns"])
+        and set(index["columns"]) <= set(df.columns)
+    )
+
+
+def export_path(reference_path):
+    """Default --export-excel report, beside (never over) the reference workbook."""
+    return os.path.join(os.path.dirname(reference_path), EXPORT_FILE)
+
+
+def _same_path(a, b):
+    return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+
+def fingerprint_index_path(reference_path):
+    return os.path.splitext(reference_path)[0] + ".fingerprints.json"
+
+
+def build_fingerprint_index(df_db, key=KEY):
+    """Fingerprint the row compare_dataframes would diff against for each XID."""
+    columns = fingerprint_columns(df_db.columns, key)
+    first_rows = df_db.drop_duplicates(subset=key, keep="first")
+    fingerprints = row_fingerprints(first_rows, columns)
+    return {
+        "version": FINGERPRINT_VERSION,
+        "columns": columns,
+        "fingerprints": dict(zip(first_rows[key].astype(str), fingerprints)),
+    }
+
+
+def update_fingerprint_index(index, new_data, key=KEY):
+    """Add fingerprints for XIDs that were not yet in the reference DB."""
+    unseen = new_data.loc[~new_data[key].astype(str).isin(index["fingerprints"])]
+    unseen = unseen.drop_duplicates(subset=key, keep="first")
+    if not unseen.empty:
+        fingerprints = row_fingerprints(
+            unseen.reindex(columns=index["columns"]), index["columns"]
+        )
+        index["fingerprints"].update(zip(unseen[key].astype(str), fingerprints))
+    return index
+
+
+def load_fingerprint_index(path, signature=None):
+    """
+    The saved index, or None if it is missing, unreadable, of another version
+    or (given the workbook's `signature`) taken of another workbook.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get("version") != FINGERPRINT_VERSION:
+        return None
+    if signature is not None and index.get("source") != signature:
+        return None
+    if not {"columns", "fingerprints"} <= set(index):
+        return None
+    return index
+
+
+def save_fingerprint_index(index, path, signature=None):
+    """Write the index atomically, tagged with the signature of its workbook."""
+    if signature is not None:
+        index["source"] = signature
+
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+
+    atomic_write(path, write)
+
+
+# ----------------------------
+# Arrow snapshot of the workbook
+# ----------------------------
+SNAPSHOT_VERSION = 1
+# Python value types an object column is split into, one Arrow column each
+SNAPSHOT_KINDS = ("str", "int", "float", "bool", "none")
+
+
+def snapshot_path(reference_path):
+    return os.path.splitext(reference_path)[0] + ".arrow"
+
+
+def source_signature(path):
+    """Size and mtime of the workbook; a snapshot taken of another one is stale."""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _value_kind(value):
+    if value is None:
+        return "none"
+    if isinstance(value, str):
+        return "str"
+    if isinstance(value, (bool, np.bool_)):
+        return "bool"
+    if isinstance(value, (int, np.integer)):
+        return "int"
+    if isinstance(value, (float, np.floating)):
+        return "float"
+    raise TypeError(f"{type(value).__name__} values are not snapshotted")
+
+
+def _snapshot_arrays(col, series):
+    """(field name, Arrow array) pairs holding one column of the reference DB."""
+    if series.dtype != object:
+        return [(f"{col}\x1fnative", pa.array(series, from_pandas=False))]
+    values = series.to_numpy()
+    kinds = np.array([_value_kind(value) for value in values])
+    arrow_types = {
+        "str": pa.string(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "bool": pa.bool_(),
+    }
+    arrays = []
+    for kind in SNAPSHOT_KINDS:
+        mask = kinds == kind
+        if not mask.any():
+            continue
+        name = f"{col}\x1f{kind}"
+        if kind == "none":
+            arrays.append((name, pa.nulls(len(values))))
+            continue
+        typed = np.where(mask, values, {"str": "", "bool": False}.get(kind, 0))
+        arrays.append((name, pa.array(typed, type=arrow_types[kind], mask=~mask)))
+    return arrays
+
+
+def _read_back_column(table, names, length):
+    """Undo _snapshot_arrays for one column."""
+    if len(names) == 1 and names[0].endswith("\x1fnative"):
+        return table.column(names[0]).to_pandas()
+    values = np.full(length, None, dtype=object)
+    for name in names:
+        kind = name.split("\x1f")[1]
+        if kind == "none":
+            continue
+        column = table.column(name)
+        mask = column.is_valid().to_numpy(zero_copy_only=False)
+        if kind != "str":
+            column = column.fill_null(False if kind == "bool" else 0)
+        values[mask] = column.to_numpy(zero_copy_only=False)[mask].astype(object)
+    return pd.Series(values, dtype=object)
+
+
+def write_snapshot(df, path, signature):
+    """
+    Atomically replace the snapshot at `path` with `df`. Nothing is written
+    (and False returned) without pyarrow or for values Arrow cannot hold
+    faithfully, in which case any old snapshot is removed so it is not used.
+    """
+    if pa is None:
+        return False
+    try:
+        fields, arrays = [], []
+        for col in df.columns:
+            for name, array in _snapshot_arrays(col, df[col]):
+                fields.append(pa.field(name, array.type))
+                arrays.append(array)
+    except (TypeError, pa.ArrowException):
+        if os.path.exists(path):
+            os.remove(path)
+        return False
+    metadata = {
+        "version": str(SNAPSHOT_VERSION),
+        "source": signature,
+        "columns": json.dumps([str(col) for col in df.columns]),
+        "rows": str(len(df)),
+    }
+    table = pa.Table.from_arrays(arrays, schema=pa.schema(fields, metadata=metadata))
+
+    def write(tmp_path):
+        # uncompressed so the file can be memory-mapped as is
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    atomic_write(path, write)
+    return True
+
+
+def read_snapshot(path, signature):
+    """
+    The reference DB from a snapshot of the workbook with `signature`, or None
+    when there is no usable one. The file is memory-mapped, so Arrow reads it
+    without copying and only the conversion to pandas touches the data.
+    """
+    if pa is None or not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path, "r") as source:
+            table = pa.ipc.open_file(source).read_all()
+            metadata = {
+                key.decode(): value.decode()
+                for key, value in (table.schema.metadata or {}).items()
+            }
+            if (
+                metadata.get("version") != str(SNAPSHOT_VERSION)
+                or metadata.get("source") != signature
+            ):
+                return None
+            length = int(metadata["rows"])
+            names = {}
+            for name in table.column_names:
+                names.setdefault(name.split("\x1f")[0], []).append(name)
+            return pd.DataFrame(
+                {
+                    col: _read_back_column(table, names[col], length)
+                    for col in json.loads(metadata["columns"])
+                },
+                index=pd.RangeIndex(length),
+            )
+    except (OSError, KeyError, ValueError, pa.ArrowException):
+        return None
+
+
+def as_read_back(df):
+    """
+    `df` as pd.read_excel(keep_default_na=False) returns it after to_excel:
+    missing values come back as "", whole floats as ints and columns get the
+    dtype their values allow. Snapshots written after an upsert use this, so
+    the next run sees the same values whether it reads the snapshot or not.
+    """
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == object or series.dtype.kind == "f":
+            values = series.to_numpy(dtype=object, copy=True)
+            for i, value in enumerate(values):
+                if value is None or (isinstance(value, float) and np.isnan(value)):
+                    values[i] = ""
+                elif (
+                    isinstance(value, (float, np.floating))
+                    and float(value).is_integer()
+                ):
+                    values[i] = int(value)
+                elif isinstance(value, np.generic):
+                    values[i] = value.item()
+            series = pd.Series(values, index=df.index, dtype=object).infer_objects()
+        out[col] = series
+    return pd.DataFrame(out, index=df.index).reset_index(drop=True)
+
+
+# ----------------------------
+# Reference store backends
+# ----------------------------
+class ExcelReferenceStore:
+    """Legacy store: the full reference history lives in one workbook.
+
+    Updated XIDs are appended, so the workbook can hold several rows per XID and
+    comparisons are made against the first one. An Arrow snapshot next to the
+    workbook stands in for parsing it until the workbook changes.
+    """
+
+    def __init__(self, path, snapshot=True):
+        self.path = path
+        self.fingerprint_path = fingerprint_index_path(path)
+        self.snapshot_path = snapshot_path(path) if snapshot else None
+        self._df = None
+        self._index = None
+
+    def load(self):
+        if self._df is None:
+            if os.path.exists(self.path):
+                self._df = self._load_workbook()
+            else:
+                self._df = pd.DataFrame(columns=[KEY])
+        return self._df
+
+    def _load_workbook(self):
+        """The workbook's rows, from its snapshot unless that is missing or stale."""
+        if self.snapshot_path is None:
+            return pd.read_excel(self.path, keep_default_na=False)
+        signature = source_signature(self.path)
+        df = read_snapshot(self.snapshot_path, signature)
+        if df is None:
+            df = pd.read_excel(self.path, keep_default_na=False)
+            write_snapshot(df, self.snapshot_path, signature)
+        return df
+
+    def fingerprints(self):
+        if self._index is None:
+            self._index = load_fingerprint_index(
+                self.fingerprint_path, self._signature()
+            )
+        if self._index is None:
+            self._index = build_fingerprint_index(self.load())
+        return self._index
+
+    def _signature(self):
+        """Signature of the workbook the index must match ("" if there is none)."""
+        return source_signature(self.path) if os.path.exists(self.path) else ""
+
+    def upsert(self, new_data):
+        """Append `new_data` and rewrite the workbook. Returns rows written."""
+        if new_data.empty:
+            return 0
+        signature = self._signature()
+        df_db = self.load()
+        updated_reference_db = pd.concat([df_db, new_data], ignore_index=True)
+        updated_reference_db = updated_reference_db.drop_duplicates(keep="last")
+        write_frame(updated_reference_db, self.path)
+        self._df = updated_reference_db
+        if self.snapshot_path is not None:
+            write_snapshot(
+                as_read_back(updated_reference_db),
+                self.snapshot_path,
+                source_signature(self.path),
+            )
+
+        index = self._index or load_fingerprint_index(self.fingerprint_path, signature)
+        if index is None or index["columns"] != fingerprint_columns(
+            updated_reference_db.columns
+        ):
+            # first rows, or the hashed column set changed: hash everything again
+            self._index = build_fingerprint_index(updated_reference_db)
+        else:
+            self._index = update_fingerprint_index(index, new_data)
+        save_fingerprint_index(self._index, self.fingerprint_path, self._signature())
+        return len(new_data)
+
+    def export_excel(self, path):
+        if _same_path(path, self.path):
+            raise ValueError(f"Refusing to export over the reference workbook: {path}")
+        write_frame(self.load(), path)
+
+
+class SQLiteReferenceStore:
+    """Reference rows in a local SQLite table keyed on XID (latest row wins).
+
+    Each row carries its content fingerprint, so change detection only reads the
+    XID and Fingerprint columns (once; the index is kept up to date in memory)
+    and upserts touch just the changed rows.
+    """
+
+    table = "reference_db"
+
+    def __init__(self, path, seed_workbook=None):
+        self.path = path
+        self.seed_workbook = seed_workbook
+        self._index = None
+        is_new = not os.path.exists(path)
+        self.conn = sqlite3.connect(path)
+        if is_new and seed_workbook and os.path.exists(seed_workbook):
+            seed = pd.read_excel(seed_workbook, keep_default_na=False)
+            self.upsert(seed.drop_duplicates(subset=KEY, keep="last"))
+
+    def _columns(self):
+        rows = self.conn.execute(f'PRAGMA table_info("{self.table}")').fetchall()
+        return [row[1] for row in rows]
+
+    def _ensure_columns(self, columns):
+        existing = self._columns()
+        added = [col for col in dict.fromkeys(columns) if col not in existing]
+        if not added:
+            return
+        self._index = None  # hashed column set changes
+        if not existing:
+            cols = [f'"{KEY}" TEXT PRIMARY KEY'] + [
+                f'"{col}"' for col in added if col != KEY
+            ]
+            self.conn.execute(f'CREATE TABLE "{self.table}" ({", ".join(cols)})')
+            return
+        # Stored fingerprints hash the old column set: rehash them in the same
+        # transaction as the ALTER, so they never describe the wrong columns
+        with self.conn:
+            self.conn.execute("BEGIN")
+            for col in added:
+                self.conn.execute(f'ALTER TABLE "{self.table}" ADD COLUMN "{col}"')
+            self._rehash()
+
+    def _rehash(self):
+        """Recompute the Fingerprint of every stored row over the current columns."""
+        rows = self.load()
+        if rows.empty:
+            return
+        fingerprints = row_fingerprints(rows, fingerprint_columns(rows.columns))
+        self.conn.executemany(
+            f'UPDATE "{self.table}" SET "{FINGERPRINT_COL}" = ? WHERE "{KEY}" = ?',
+            zip(fingerprints, rows[KEY].astype(str)),
+        )
+
+    def load(self):
+        columns = [col for col in self._columns() if col != FINGERPRINT_COL]
+        if not columns:
+            return pd.DataFrame(columns=[KEY])
+        select = ", ".join(f'"{col}"' for col in columns)
+        return pd.read_sql_query(f'SELECT {select} FROM "{self.table}"', self.conn)
+
+    def fingerprints(self):
+        if self._index is not None:
+            return self._index
+        columns = fingerprint_columns(self._columns())
+        rows = []
+        if columns:
+            rows = self.conn.execute(
+                f'SELECT "{KEY}", "{FINGERPRINT_COL}" FROM "{self.table}"'
+            ).fetchall()
+        self._index = {
+            "version": FINGERPRINT_VERSION,
+            "columns": columns,
+            "fingerprints": dict(rows),
+        }
+        return self._index
+
+    def upsert(self, new_data):
+        """Insert or replace the rows of `new_data` whose content changed."""
+        if new_data.empty:
+            return 0
+        data = new_data.drop_duplicates(subset=KEY, keep="last").copy()
+        data[KEY] = data[KEY].astype(str)
+        self._ensure_columns(list(data.columns) + [FINGERPRINT_COL])
+
+        columns = fingerprint_columns(self._columns())
+        for col in columns:
+            if col not in data.columns:
+                data[col] = None
+        data[FINGERPRINT_COL] = row_fingerprints(data, columns)
+
+        stored = self.fingerprints()["fingerprints"]
+        data = data.loc[data[KEY].map(stored) != data[FINGERPRINT_COL]]
+        if data.empty:
+            return 0
+
+        data = data[[KEY, *columns, FINGERPRINT_COL]]
+        data = data.astype(object).where(data.notna(), None)
+        names = ", ".join(f'"{col}"' for col in data.columns)
+        marks = ", ".join("?" for _ in data.columns)
+        with self.conn:
+            self.conn.executemany(
+                f'INSERT OR REPLACE INTO "{self.table}" ({names}) VALUES ({marks})',
+                data.itertuples(index=False, name=None),
+            )
+        stored.update(zip(data[KEY], data[FINGERPRINT_COL]))
+        return len(data)
+
+    def export_excel(self, path):
+        """Write the table out as a report; never over the workbook it was seeded from."""
+        if self.seed_workbook and _same_path(path, self.seed_workbook):
+            raise ValueError(f"Refusing to export over the seed workbook: {path}")
+        write_frame(self.load(), path)
+
+
+REFERENCE_BACKENDS = ["excel", "sqlite"]
+
+
+def open_reference_store(backend, reference_path, snapshot=True):
+    """
+    Open the reference DB for `backend`; the workbook seeds a new SQLite store.
+    `snapshot` lets the Excel store load its Arrow snapshot instead of the workbook.
+    """
+    if backend == "excel":
+        return ExcelReferenceStore(reference_path, snapshot=snapshot)
+    if backend == "sqlite":
+        return SQLiteReferenceStore(
+            os.path.splitext(reference_path)[0] + ".sqlite",
+            seed_workbook=reference_path,
+        )
+    raise ValueError(f"Unknown reference backend: {backend}")
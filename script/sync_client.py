@@ -0,0 +1,295 @@
+import math
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+FIELD_DETAILS_URL = "http://172.16.3.229/NL_Upgrade/api/field_details_api.php"
+KEY = "XID"
+SYNC_BATCH_SIZE = 500
+FETCH_PAGE_SIZE = 1000
+# Hard stop for paged fetches (10M rows at the default page size)
+MAX_PAGES = 10_000
+REQUEST_TIMEOUT = 60
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+# ----------------------------
+# Session
+# ----------------------------
+def make_session(pool_size=4, retries=3, backoff=0.5):
+    """
+    One pooled keep-alive session for every call of a run. Connection errors and
+    RETRY_STATUSES are retried with exponential backoff (Retry-After is honoured).
+    POST is retried too: the API upserts on XID, so resending a batch is safe.
+    """
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=backoff,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# ----------------------------
+# Push
+# ----------------------------
+def to_records(df):
+    """JSON-ready row dicts (NaN becomes null)."""
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def iter_record_batches(records, batch_size):
+    for start in range(0, len(records), batch_size):
+        yield records[start : start + batch_size]
+
+
+def push_batch(session, url, records, timeout=REQUEST_TIMEOUT):
+    """POST one batch; raises once the session's retries are used up."""
+    resp = session.post(url, json=records, timeout=timeout)
+    resp.raise_for_status()
+    return resp
+
+
+def push_records(session, url, records, batch_size=SYNC_BATCH_SIZE, workers=1):
+    """
+    Send `records` in batches, `workers` at a time. Returns (sent, failed) where
+    failed lists (batch, error) for batches that still failed after retrying.
+    """
+    batches = list(iter_record_batches(records, batch_size))
+
+    def send(batch):
+        try:
+            push_batch(session, url, batch)
+            return batch, None
+        except requests.RequestException as error:
+            return batch, error
+
+    if workers > 1 and len(batches) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(send, batches))
+    else:
+        results = [send(batch) for batch in batches]
+
+    sent = sum(len(batch) for batch, error in results if error is None)
+    failed = [(batch, error) for batch, error in results if error is not None]
+    return sent, failed
+
+
+def partial_update_records(change_log):
+    """XID -> update payload holding only the changed fields of that XID."""
+    updates = change_log.loc[change_log["Change"] == "update"]
+    records = {}
+    for xid, column, new in zip(updates[KEY], updates["Column"], updates["New"]):
+        records.setdefault(str(xid), {KEY: xid})[column] = new
+    return records
+
+
+def sync_records(
+    new_data,
+    known_xids,
+    url=FIELD_DETAILS_URL,
+    batch_size=SYNC_BATCH_SIZE,
+    workers=1,
+    session=None,
+    partial_updates=None,
+):
+    """
+    Push the output of compare_dataframes to the field details API: XIDs not in
+    `known_xids` are inserted, the rest updated (both POST, as the API expects).
+    With `partial_updates` (see partial_update_records) updates only carry the
+    changed fields. Returns a summary dict including the XIDs of failed batches.
+    """
+    session = session or make_session(pool_size=max(workers, 1))
+    is_known = new_data[KEY].astype(str).isin(known_xids)
+    summary = {"inserted": 0, "updated": 0, "failed_xids": []}
+
+    print("\n🚀------------------------------------🚀\n")
+    print("Syncing data ...\n")
+
+    for label, rows in (
+        ("inserted", new_data[~is_known]),
+        ("updated", new_data[is_known]),
+    ):
+        if rows.empty:
+            continue
+        records = to_records(rows)
+        if label == "updated" and partial_updates is not None:
+            records = [
+                partial_updates[str(record[KEY])]
+                for record in records
+                if str(record[KEY]) in partial_updates
+            ]
+        sent, failed = push_records(
+            session, url, records, batch_size=batch_size, workers=workers
+        )
+        summary[label] = sent
+        for batch, error in failed:
+            print(f"Batch of {len(batch)} failed : {error}")
+            summary["failed_xids"].extend(str(record[KEY]) for record in batch)
+
+    print(
+        f"Inserted : {summary['inserted']}, Updated : {summary['updated']}, "
+        f"Failed : {len(summary['failed_xids'])}"
+    )
+    print("\n🛑------------------------------------🛑\n")
+    return summary
+
+
+# ----------------------------
+# Paged fetch
+# ----------------------------
+def page_params(page, page_size):
+    """Query for one page of the reference table (page numbers start at 1)."""
+    return {"key": "all", "value": "all", "page": page, "limit": page_size}
+
+
+def page_records(payload):
+    """Rows of one page; the API answers with a bare list or {"data": [...]}."""
+    if isinstance(payload, dict):
+        return payload.get("data") or []
+    return payload or []
+
+
+def page_count(payload, page_size):
+    """Total pages if the response says so (a "total" row count), else None."""
+    if isinstance(payload, dict) and payload.get("total") is not None:
+        pages = max(math.ceil(int(payload["total"]) / page_size), 1)
+        if pages > MAX_PAGES:
+            raise ValueError(f"{pages} pages reported, more than MAX_PAGES")
+        return pages
+    return None
+
+
+def is_last_page(rows, previous, page, page_size, pages=None):
+    """
+    True once `rows` (page `page`) ends the table: page `pages` if the API gave
+    a total, else a short page; or a first page longer than `page_size` from an
+    API that ignores paging and sent it all.
+    Raises ValueError instead of paging forever when a later page is oversized
+    or repeats the previous one, or after MAX_PAGES pages.
+    """
+    if len(rows) > page_size:
+        if page == 1:
+            return True
+        raise ValueError(
+            f"Page {page} has {len(rows)} rows for limit={page_size}: "
+            "the API is not paging"
+        )
+    if rows and rows == previous:
+        raise ValueError(f"Page {page} repeats page {page - 1}: the API is not paging")
+    if pages is not None:
+        return page >= pages
+    if len(rows) < page_size:
+        return True
+    if page >= MAX_PAGES:
+        raise ValueError(f"Still full pages after {MAX_PAGES} pages; giving up")
+    return False
+
+
+def fetch_page(session, url, page, page_size=FETCH_PAGE_SIZE, timeout=REQUEST_TIMEOUT):
+    resp = session.get(url, params=page_params(page, page_size), timeout=timeout)
+    resp.raise_for_status()
+    return resp.json()
+
+
+def iter_reference_pages(session, url=FIELD_DETAILS_URL, page_size=FETCH_PAGE_SIZE):
+    """Yield the reference rows page by page until is_last_page says stop."""
+    page, previous = 1, None
+    while True:
+        rows = page_records(fetch_page(session, url, page, page_size))
+        last = is_last_page(rows, previous, page, page_size)
+        if rows:
+            yield rows
+        if last:
+            return
+        page, previous = page + 1, rows
+
+
+def fetch_reference_table(
+    url=FIELD_DETAILS_URL, page_size=FETCH_PAGE_SIZE, session=None
+):
+    """Replacement for get_table_data(): the whole table, one page at a time."""
+    session = session or make_session()
+    rows = []
+    for page in iter_reference_pages(session, url, page_size):
+        rows.extend(page)
+    return pd.DataFrame(rows, columns=None if rows else [KEY])
+
+
+# ----------------------------
+# Concurrent paged fetch
+# ----------------------------
+async def load_reference_async(
+    url=FIELD_DETAILS_URL, page_size=FETCH_PAGE_SIZE, concurrency=4, session=None
+):
+    """
+    Fetch the reference table with up to `concurrency` pages in flight. Each
+    page is turned into a DataFrame on the worker thread as soon as it lands,
+    so only the final concat is left once the last page arrives. Page 1 gives
+    the total when the API reports one; otherwise pages are requested in
+    windows of `concurrency` until is_last_page says stop.
+    """
+    session = session or make_session(pool_size=concurrency)
+    loop = asyncio.get_running_loop()
+
+    def fetch_frame(page):
+        payload = fetch_page(session, url, page, page_size)
+        rows = page_records(payload)
+        return payload, rows, pd.DataFrame(rows)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+
+        def fetch(pages):
+            return asyncio.gather(
+                *(loop.run_in_executor(pool, fetch_frame, page) for page in pages)
+            )
+
+        ((first, previous, frame),) = await fetch([1])
+        frames = [frame]
+        pages = page_count(first, page_size)
+        done = is_last_page(previous, None, 1, page_size, pages)
+        page = 2
+        while not done:
+            # every remaining page at once when the total is known
+            window = pages + 1 - page if pages is not None else concurrency
+            for _, rows, frame in await fetch(range(page, page + window)):
+                done = is_last_page(rows, previous, page, page_size, pages)
+                frames.append(frame)
+                page, previous = page + 1, rows
+                if done:
+                    break
+
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=[KEY])
+    return pd.concat(frames, ignore_index=True)
+
+
+def start_reference_download(
+    url=FIELD_DETAILS_URL, page_size=FETCH_PAGE_SIZE, concurrency=4
+):
+    """
+    Run load_reference_async on a background thread and return its Future, so
+    the caller can parse the panel export while the reference table downloads.
+    """
+    executor = ThreadPoolExecutor(max_workers=1)
+    future = executor.submit(
+        asyncio.run, load_reference_async(url, page_size, concurrency)
+    )
+    executor.shutdown(wait=False)
+    return future